@@ -1,11 +1,20 @@
 from common_plots import Plot
-from statistics import Statistics
+from statistics import Running_Statistics
 from convolution import Convolve
 from correlation import Correlation
-from fourier_transform import FourierTransform
+from fourier_transform import FourierTransform, SlidingDFT, goertzel
 from fourier_inverse_transform import FourierInverseTransform
 from complex_fourier_transform import ComplexFourierTransform
 from fft import FFT
-from fir import FIR
+from fir import FIR, CachedFIR, StreamingFIR
+from stft import STFT
+from psd import Welch, welch, bartlett_periodogram
+from windows import get_window, window_metrics
+from multirate import PolyphaseResampler, decimate, interpolate
+from signal_io import Recording, open_signal, write_signal, convert_text
+from parallel import parallel_convolve
+from profiling import profile
+from adaptive import LMS, NLMS, BlockLMS, get_buffer, adaline_filter
+from template_bank import TemplateBank
 from auxiliary import *
 from digital_filter import *
@@ -0,0 +1,281 @@
+import numpy as np
+from Common import fft
+from Common import profiling
+
+
+# Regularization added to the input power of the normalized updates, so silent inputs do not divide by zero.
+NORMALIZATION_EPS = 1e-8
+
+# Forgetting factor of the per-bin power estimate of the normalized block LMS.
+POWER_FORGETTING = 0.9
+
+
+def get_buffer(x, buffer_size=5, form='fl'):
+    """
+    Function that returns the buffer matrix Z of a signal, where row n holds the buffer at time n,
+    Z[n, k] = x[n-k], so Z @ w is the convolution of x with the filter w. Z is a strided view of a zero padded
+    copy of x, so it takes the memory of x instead of buffer_size times that memory, and its rows must not be
+    modified.
+    :param x: (numpy array) input signal of size N.
+    :param buffer_size: (int) size M of the buffer, the number of filter coefficients.
+    :param form: (string) 'fl' for the fully loaded form of N rows, the buffer while it is loaded, so Z @ w
+            is np.convolve(x, w)[:N]. 'lae' for the loaded and emptied form of N+M-1 rows, so Z @ w is
+            np.convolve(x, w, mode='full').
+    :return: (numpy array) read-only buffer matrix of shape (N, M) or (N+M-1, M).
+    """
+    x = np.ravel(x)
+    M = buffer_size
+    if form == 'fl':
+        tail = 0
+    elif form == 'lae':
+        tail = M - 1
+    else:
+        raise ValueError("Unknown form '{}', use 'fl' or 'lae'".format(form))
+    padded = np.zeros(M - 1 + x.shape[0] + tail, dtype=x.dtype)
+    padded[M - 1:M - 1 + x.shape[0]] = x
+    return np.lib.stride_tricks.sliding_window_view(padded, M)[:, ::-1]
+
+
+def adaline_filter(X, w, y_hat, alpha=0.0005, epochs=100):
+    """
+    Function that trains the coefficients of one or more filters with the ADALINE algorithm: every epoch goes
+    through the rows of the buffer matrix and moves the coefficients along the error of each sample,
+    w = w + alpha*e[n]*X[n]. Several independent filters, each with its own data, are trained in the same pass
+    by stacking them along a first axis, so the Python loop over the samples is shared by all of them.
+    :param X: (numpy array) buffer matrix of shape (N, M), see get_buffer, or (K, N, M) for K filters.
+    :param w: (numpy array) initial coefficients of shape (M,) or (K, M).
+    :param y_hat: (numpy array) expected output of shape (N,) or (K, N).
+    :param alpha: (float) learning rate or step size.
+    :param epochs: (int) number of passes over the data.
+    :return: w (numpy array) trained coefficients, with the shape of the initial ones.
+             loss (numpy array) mean square error of each epoch, of shape (epochs,) or (epochs, K).
+    """
+    X = np.asarray(X)
+    single = X.ndim == 2
+    real = fft.working_dtype(X, w, y_hat)
+    X = fft.to_precision(X.reshape((-1,) + X.shape[-2:]), real)
+    w = fft.to_precision(w, real).reshape(X.shape[0], -1).copy()
+    y_hat = fft.to_precision(y_hat, real).reshape(X.shape[0], -1)
+    alpha = float(alpha)
+
+    loss = np.zeros((epochs, X.shape[0]), dtype=real)
+    e = np.empty(y_hat.shape, dtype=real)
+    for epoch in range(epochs):
+        for n in range(X.shape[1]):
+            u = X[:, n]
+            e[:, n] = y_hat[:, n] - np.einsum('km,km->k', u, w)
+            w += (alpha * e[:, n])[:, None] * u
+        loss[epoch] = np.mean(e ** 2, axis=1)
+
+    if single:
+        return w[0], loss[:, 0]
+    return w, loss
+
+
+@profiling.profiled_methods
+class LMS():
+    def __init__(self, M, mu=0.01, w=None, filters=1, dtype=None):
+        """
+        Class that implements the least mean squares adaptive filter for signals that arrive in chunks of
+        arbitrary size. For every sample the output y[n] = w @ u[n] of the last M inputs u[n] is compared with
+        the desired signal, and the coefficients move along the error, w = w + mu*e[n]*u[n]. The coefficients
+        and the last M-1 inputs are kept between calls, so the concatenated output of all chunks is the same
+        as adapting over the whole signal in one pass. Several independent filters, one per channel, are
+        adapted together, which shares the loop over the samples between them.
+        :param M: (int) number of filter coefficients.
+        :param mu: (float) step size.
+        :param w: (numpy array) initial coefficients of shape (M,), or (filters, M) to start each filter from
+                different coefficients. By default the filters start at zero.
+        :param filters: (int) number of independent filters, that is, channels of the chunks.
+        :param dtype: (numpy dtype) precision of the filters. By default the precision of w is used, and
+                double precision if w is not given.
+
+        Attributes:
+        w (numpy array): current coefficients, of shape (M,) for a single filter or (filters, M).
+        """
+        self.M = int(M)
+        self.mu = float(mu)
+        self.filters = int(filters)
+        w0 = np.zeros(self.M) if w is None else w
+        self.dtype = fft.working_dtype(w0, dtype=dtype)
+        self.w0 = np.broadcast_to(fft.to_precision(w0, self.dtype), (self.filters, self.M)).copy()
+        self.reset()
+        return
+
+    @property
+    def w(self):
+        return self.weights[0] if self.filters == 1 else self.weights
+
+    def reset(self):
+        """
+        Function that sets the coefficients back to their initial values and clears the stored input history,
+        so the next chunk starts a new signal.
+        :return: None
+        """
+        self.weights = self.w0.copy()
+        self.history = np.zeros((self.filters, self.M - 1), dtype=self.dtype)
+        return
+
+    def update(self, x, d):
+        """
+        Function that filters a chunk of the input signal and adapts the coefficients to the desired signal.
+        :param x: (numpy array) chunk of the input signal, of shape (n,) or (n, filters).
+        :param d: (numpy array) chunk of the desired signal, with the shape of x.
+        :return: y (numpy array) output of the filters, with the shape of x.
+                 e (numpy array) error d - y, with the shape of x.
+        """
+        shape = np.shape(x)
+        x, d = self._channels(x), self._channels(d)
+        if x.shape[1] == 0:
+            return np.zeros(shape, dtype=self.dtype), np.zeros(shape, dtype=self.dtype)
+        buffer = np.concatenate((self.history, x), axis=1)
+        windows = np.lib.stride_tricks.sliding_window_view(buffer, self.M, axis=1)[..., ::-1]
+        steps = self._steps(windows)
+
+        y = np.empty(x.shape, dtype=self.dtype)
+        e = np.empty(x.shape, dtype=self.dtype)
+        w = self.weights
+        for n in range(x.shape[1]):
+            u = windows[:, n]
+            y[:, n] = np.einsum('km,km->k', u, w)
+            e[:, n] = d[:, n] - y[:, n]
+            w += (steps[:, n] * e[:, n])[:, None] * u
+
+        self.history = buffer[:, buffer.shape[1] - (self.M - 1):]
+        return y.T.reshape(shape), e.T.reshape(shape)
+
+    def _steps(self, windows):
+        """
+        Function that calculates the step size of every sample of a chunk.
+        :param windows: (numpy array) buffers of the chunk, of shape (filters, n, M).
+        :return: (numpy array) step sizes of shape (filters, n).
+        """
+        return np.full(windows.shape[:2], self.mu, dtype=self.dtype)
+
+    def _channels(self, x):
+        """
+        Function that converts a chunk to the internal layout of one row per filter.
+        :param x: (numpy array) chunk of shape (n,) or (n, filters).
+        :return: (numpy array) chunk of shape (filters, n) in the precision of the filters.
+        """
+        x = np.asarray(x, dtype=self.dtype)
+        if x.ndim == 1 and self.filters == 1:
+            return x.reshape(1, -1)
+        if x.ndim != 2 or x.shape[1] != self.filters:
+            raise ValueError("Chunks must have shape (n, {}), got {}".format(self.filters, x.shape))
+        return x.T
+
+
+@profiling.profiled_methods
+class NLMS(LMS):
+    def __init__(self, M, mu=0.5, w=None, filters=1, eps=NORMALIZATION_EPS, dtype=None):
+        """
+        Class that implements the normalized least mean squares adaptive filter, an LMS filter whose step is
+        divided by the power of the inputs in the buffer, w = w + mu*e[n]*u[n] / (eps + u[n] @ u[n]). The
+        convergence does not depend on the input level and it is stable for 0 < mu < 2.
+        :param M: (int) number of filter coefficients.
+        :param mu: (float) normalized step size, between 0 and 2.
+        :param w: (numpy array) initial coefficients of shape (M,) or (filters, M). By default zero.
+        :param filters: (int) number of independent filters, that is, channels of the chunks.
+        :param eps: (float) regularization added to the input power.
+        :param dtype: (numpy dtype) precision of the filters, see LMS.
+        """
+        super().__init__(M, mu, w, filters, dtype)
+        self.eps = float(eps)
+        return
+
+    def _steps(self, windows):
+        return self.mu / (self.eps + np.einsum('knm,knm->kn', windows, windows))
+
+
+@profiling.profiled_methods
+class BlockLMS(LMS):
+    def __init__(self, M, mu=0.5, block_size=None, w=None, filters=1, normalized=True,
+                 forgetting=POWER_FORGETTING, eps=NORMALIZATION_EPS, dtype=None):
+        """
+        Class that implements the fast block LMS adaptive filter. The coefficients are updated once per block
+        of L samples with the sum of the gradients of the block, and both the filtering and the gradient
+        correlation are calculated with FFTs of size nfft >= M+L-1, so a block costs O(nfft log nfft)
+        instead of the O(L*M) of L sample updates, and the loop runs once per block instead of once per
+        sample. The gradient is constrained to M coefficients, so the result is the exact block LMS
+        algorithm. Samples that do not fill a block are kept until the next chunk, so update returns the
+        outputs of the completed blocks only.
+        :param M: (int) number of filter coefficients.
+        :param mu: (float) step size. With normalized=True it is relative to the input power as in NLMS, and
+                between 0 and 1 is stable.
+        :param block_size: (int) number of samples L of each block. By default L = M.
+        :param w: (numpy array) initial coefficients of shape (M,) or (filters, M). By default zero.
+        :param filters: (int) number of independent filters, that is, channels of the chunks.
+        :param normalized: (boolean) if True every frequency bin of the gradient is divided by a running
+                estimate of the input power in that bin, which speeds up the convergence of colored inputs
+                such as speech.
+        :param forgetting: (float) forgetting factor of the power estimate, between 0 and 1.
+        :param eps: (float) regularization added to the power estimate.
+        :param dtype: (numpy dtype) precision of the filters, see LMS.
+        """
+        self.L = int(M if block_size is None else block_size)
+        self.nfft = 1 << int(np.ceil(np.log2(M + self.L - 1)))
+        self.normalized = normalized
+        self.forgetting = float(forgetting)
+        self.eps = float(eps)
+        super().__init__(M, mu, w, filters, dtype)
+        return
+
+    def reset(self):
+        """
+        Function that sets the coefficients back to their initial values and clears the stored input history,
+        the pending samples and the power estimate, so the next chunk starts a new signal.
+        :return: None
+        """
+        super().reset()
+        self.pending_x = np.zeros((self.filters, 0), dtype=self.dtype)
+        self.pending_d = np.zeros((self.filters, 0), dtype=self.dtype)
+        self.power = None
+        return
+
+    def update(self, x, d):
+        """
+        Function that filters a chunk of the input signal and adapts the coefficients to the desired signal,
+        one block at a time.
+        :param x: (numpy array) chunk of the input signal, of shape (n,) or (n, filters).
+        :param d: (numpy array) chunk of the desired signal, with the shape of x.
+        :return: y (numpy array) output of the filters for the completed blocks, of shape (m,) or
+                   (m, filters), where m is a multiple of the block size.
+                 e (numpy array) error d - y, with the shape of y.
+        """
+        column = np.ndim(x) == 2
+        x = np.concatenate((self.pending_x, self._channels(x)), axis=1)
+        d = np.concatenate((self.pending_d, self._channels(d)), axis=1)
+        M, L, nfft = self.M, self.L, self.nfft
+        n = x.shape[1] // L * L
+        buffer = np.concatenate((self.history, x[:, :n]), axis=1)
+        y = np.empty((self.filters, n), dtype=self.dtype)
+
+        # Block b uses the inputs b*L-M+1 ... b*L+L-1 of the buffer. All the input spectra are calculated
+        # at once; only the coefficient updates depend on the previous block.
+        if n:
+            blocks = np.lib.stride_tricks.sliding_window_view(buffer, M - 1 + L, axis=1)[:, ::L]
+            U = np.fft.rfft(blocks, nfft)
+            if self.normalized:
+                power = np.abs(U) ** 2
+                if self.power is None:
+                    self.power = power[:, 0]
+        e_pad = np.zeros((self.filters, nfft), dtype=self.dtype)
+        step = self.mu / M if self.normalized else self.mu
+        for b in range(n // L):
+            Ub = U[:, b]
+            y[:, b * L:(b + 1) * L] = np.fft.irfft(Ub * np.fft.rfft(self.weights, nfft), nfft)[:, M - 1:M - 1 + L]
+            e_pad[:, M - 1:M - 1 + L] = d[:, b * L:(b + 1) * L] - y[:, b * L:(b + 1) * L]
+            G = np.fft.rfft(e_pad) * np.conj(Ub)
+            if self.normalized:
+                self.power = self.forgetting * self.power + (1 - self.forgetting) * power[:, b]
+                G /= self.eps + self.power / (M - 1 + L)
+            self.weights += step * np.fft.irfft(G, nfft)[:, :M].astype(self.dtype, copy=False)
+
+        e = d[:, :n] - y
+        self.history = buffer[:, buffer.shape[1] - (M - 1):]
+        self.pending_x = x[:, n:]
+        self.pending_d = d[:, n:]
+        if column or self.filters > 1:
+            return y.T, e.T
+        return y[0], e[0]
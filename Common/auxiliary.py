@@ -13,15 +13,16 @@ def zero_padding(x, h):
     Returns: 
     x_pad(numpy array): Array of numbers representing an input signal x padded with zeros.
     h_pad(numpy array): Array of numbers representing an input signal h padded with zeros.
+    The padded signal keeps its dtype and its number of dimensions.
     """
     N = x.shape[0]
     M = h.shape[0]
         
     if(M<N):
-        h_pad = np.append(h,np.zeros((N-M,1)), axis=0)
+        h_pad = np.append(h,np.zeros((N-M,)+h.shape[1:], dtype=h.dtype), axis=0)
         x_pad = x
     elif(M>N):
-        x_pad = np.append(x,np.zeros((N-M,1)), axis=0)
+        x_pad = np.append(x,np.zeros((M-N,)+x.shape[1:], dtype=x.dtype), axis=0)
         h_pad = h
     else:
         x_pad = x
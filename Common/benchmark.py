@@ -0,0 +1,293 @@
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import scipy
+import scipy.signal
+from Common import convolution
+from Common import correlation
+from Common import digital_filter
+from Common import fft
+from Common import fir
+from Common import fourier_transform
+
+
+# Grids of the benchmark. The quick grid is meant for a fast check, the full grid for tracked results.
+SIZES = {'quick': (2 ** 10, 2 ** 14), 'full': (2 ** 10, 2 ** 14, 2 ** 18, 2 ** 20)}
+DTYPES = (np.float32, np.float64)
+CHANNELS = (1, 8)
+
+# Largest size used for the O(N^2) DFT and for the filter designs, whose size is the kernel length.
+DFT_MAX_SIZE = 2 ** 12
+DESIGN_MAX_SIZE = 2 ** 14
+
+# Length of the filter kernel convolved and correlated with the signals.
+KERNEL_SIZE = 129
+
+# Minimum measured time of each case. Fast cases are repeated until this time is reached.
+MIN_TIME = 0.05
+
+# Relative slowdown, or growth of peak memory, reported as a regression by compare.
+REGRESSION_THRESHOLD = 0.10
+
+
+def benchmark_cases(grid='quick'):
+    """
+    Function that builds the benchmark cases of every Common entry point over a grid of sizes, dtypes and
+    channel counts. Each case has a NumPy/SciPy baseline that computes the same quantity, except
+    'FFT.fft[cold plan]', which clears the FFT plan cache before every call and whose baseline is FFT.fft
+    with the plans cached.
+    :param grid: (string) 'quick' or 'full', see SIZES.
+    :return: (list) cases, dictionaries with the name and parameters of the case, the number of samples it
+             processes, and the functions run and baseline that take no arguments.
+    """
+    if grid not in SIZES:
+        raise ValueError("Unknown grid '{}', use 'quick' or 'full'".format(grid))
+    rng = np.random.default_rng(0)
+    C = convolution.Convolve()
+    R = correlation.Correlation()
+    F = fft.FFT()
+    D = fir.FIR()
+    cached = fir.CachedFIR()
+    ft = fourier_transform.FourierTransform(np.zeros(2))
+
+    cases = []
+
+    def add(name, size, dtype, channels, run, baseline):
+        cases.append({'name': name, 'size': size, 'dtype': np.dtype(dtype).name, 'channels': channels,
+                      'samples': size * channels, 'run': run, 'baseline': baseline})
+
+    for size in SIZES[grid]:
+        for dtype in DTYPES:
+            x = rng.standard_normal(size).astype(dtype)
+            h = D.low_pass_filter(0.1, KERNEL_SIZE, dtype=dtype)
+            xs = {c: rng.standard_normal((size, c)).astype(dtype) for c in CHANNELS}
+
+            for method in ('overlap_add', 'overlap_save'):
+                add('Convolve.fft_convolve[{}]'.format(method), size, dtype, 1,
+                    lambda x=x, h=h, method=method: C.fft_convolve(x, h, method),
+                    lambda x=x, h=h: scipy.signal.fftconvolve(x, h))
+            for algorithm in ('fast', 'input', 'output', 'fft'):
+                add('Convolve.convolve[{}]'.format(algorithm), size, dtype, 1,
+                    lambda x=x, h=h, algorithm=algorithm: C.convolve(x, h, algorithm),
+                    lambda x=x, h=h: scipy.signal.convolve(x, h))
+
+            add('Correlation.correlation[fft]', size, dtype, 1,
+                lambda x=x, h=h: R.correlation(x, h, 'fft'),
+                lambda x=x, h=h: scipy.signal.correlate(x, h, method='fft'))
+            add('Correlation.correlation[fft, max_lag]', size, dtype, 1,
+                lambda x=x, h=h: R.correlation(x, h, 'fft', max_lag=KERNEL_SIZE),
+                lambda x=x, h=h: scipy.signal.correlate(x, h, method='fft'))
+            add('Correlation.auto_corr[fft]', size, dtype, 1,
+                lambda x=x: R.auto_corr(x, 'fft'),
+                lambda x=x: scipy.signal.correlate(x, x, method='fft'))
+            add('Correlation.norm_correlation[fft]', size, dtype, 1,
+                lambda x=x, h=h: R.norm_correlation(x, h, 'fft'),
+                lambda x=x, h=h: scipy.signal.correlate(x, h, method='fft') / np.sqrt(np.sum(x ** 2) *
+                                                                                     np.sum(h ** 2)))
+            add('Correlation.norm_auto_corr[fft]', size, dtype, 1,
+                lambda x=x: R.norm_auto_corr(x, 'fft'),
+                lambda x=x: scipy.signal.correlate(x, x, method='fft') / np.sum(x ** 2))
+
+            for c, xc in xs.items():
+                X = np.fft.rfft(xc, axis=0)
+                Xc = np.fft.fft(xc, axis=0)
+                add('FFT.fft', size, dtype, c, lambda xc=xc: F.fft(xc), lambda xc=xc: np.fft.rfft(xc, axis=0))
+                # The baseline of the cold case is the warm one, so its ratio is the gain of the plan cache
+                add('FFT.fft[cold plan]', size, dtype, c, lambda xc=xc: _cold_fft(F, xc),
+                    lambda xc=xc: F.fft(xc))
+                add('FFT.fft[two sided]', size, dtype, c, lambda xc=xc: F.fft(xc, one_sided=False),
+                    lambda xc=xc: np.fft.fft(xc, axis=0))
+                add('FFT.ifft', size, dtype, c, lambda X=X: F.ifft(X), lambda X=X: np.fft.irfft(X, axis=0))
+                add('FFT.ifft[two sided]', size, dtype, c, lambda Xc=Xc: F.ifft(Xc, one_sided=False),
+                    lambda Xc=Xc: np.fft.ifft(Xc, axis=0))
+                if size <= DFT_MAX_SIZE:
+                    add('FourierTransform.dft', size, dtype, c, lambda xc=xc: ft.dft(xc),
+                        lambda xc=xc: np.fft.rfft(xc, axis=0))
+
+        w = 2 * np.pi * np.arange(size) / size
+        a, b = scipy.signal.butter(8, 0.2)
+        add('filter_frequency_response', size, np.float64, 1,
+            lambda w=w: digital_filter.filter_frequency_response(a, b, w),
+            lambda w=w: scipy.signal.freqz(a, b, worN=w))
+
+        if size <= DESIGN_MAX_SIZE:
+            add('FIR.low_pass_filter', size, np.float64, 1, lambda size=size: D.low_pass_filter(0.1, size),
+                lambda size=size: scipy.signal.firwin(size, 0.2, window='blackman'))
+            add('FIR.high_pass_filter', size, np.float64, 1, lambda size=size: D.high_pass_filter(0.1, size),
+                lambda size=size: scipy.signal.firwin(size + 1, 0.2, window='blackman', pass_zero=False))
+            add('FIR.band_filter', size, np.float64, 1, lambda size=size: D.band_filter(0.1, 0.2, size),
+                lambda size=size: scipy.signal.firwin(size + 1, [0.2, 0.4], window='hamming', pass_zero=False))
+            add('CachedFIR.low_pass_filter', size, np.float64, 1,
+                lambda size=size: cached.low_pass_filter(0.1, size),
+                lambda size=size: scipy.signal.firwin(size, 0.2, window='blackman'))
+    return cases
+
+
+def measure(function, min_time=MIN_TIME):
+    """
+    Function that measures the run time and peak memory of a function.
+    :param function: (function) function without arguments.
+    :param min_time: (float) the function is repeated until this many seconds have passed.
+    :return: seconds (float) best time of one call.
+             peak (int) peak memory in bytes allocated by one call, measured with tracemalloc.
+             result: value returned by the function.
+    """
+    result = function()
+    best = np.inf
+    total = 0.0
+    while total < min_time:
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = min(best, elapsed)
+        total += elapsed
+
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak, result
+
+
+def run(grid='quick', select=None, min_time=MIN_TIME, output=None):
+    """
+    Function that runs the benchmark cases and stores the results as JSON.
+    :param grid: (string) 'quick' or 'full', see SIZES.
+    :param select: (string) if given, only the cases whose name contains this string are run.
+    :param min_time: (float) minimum measured time of each case in seconds.
+    :param output: (string) path of the JSON file. If None, the results are only returned.
+    :return: (dict) 'environment', with the versions used, and 'results', one entry per case with its
+             time, throughput in samples per second, peak memory and ratio of time to the baseline. Cases
+             of functions not yet implemented, which return None, have the status 'not implemented'.
+    """
+    results = []
+    for case in benchmark_cases(grid):
+        if select is not None and select not in case['name']:
+            continue
+        entry = {k: case[k] for k in ('name', 'size', 'dtype', 'channels')}
+        seconds, peak, result = measure(case['run'], min_time)
+        if result is None:
+            entry['status'] = 'not implemented'
+        else:
+            base_seconds, base_peak, _ = measure(case['baseline'], min_time)
+            entry.update({'status': 'ok', 'seconds': seconds, 'throughput': case['samples'] / seconds,
+                          'peak_memory': peak, 'baseline_seconds': base_seconds,
+                          'baseline_peak_memory': base_peak, 'ratio': seconds / base_seconds})
+        results.append(entry)
+        print(_format(entry))
+
+    report = {'environment': {'python': platform.python_version(), 'numpy': np.__version__,
+                              'scipy': scipy.__version__, 'machine': platform.machine(),
+                              'processor': platform.processor(), 'date': time.strftime('%Y-%m-%d %H:%M:%S')},
+              'grid': grid, 'results': results}
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=1)
+    return report
+
+
+def compare(old, new, threshold=REGRESSION_THRESHOLD):
+    """
+    Function that compares two benchmark runs and reports the cases that got slower or used more memory.
+    :param old: (string or dict) path of the JSON file of the reference run, or its results.
+    :param new: (string or dict) path of the JSON file of the new run, or its results.
+    :param threshold: (float) relative growth of time or peak memory reported as a regression.
+    :return: (list) regressions, one dictionary per case with the old and new values.
+    """
+    def key(e):
+        return e['name'], e['size'], e['dtype'], e['channels']
+
+    old, new = _load(old), _load(new)
+    reference = {key(e): e for e in old['results'] if e['status'] == 'ok'}
+
+    regressions = []
+    for entry in new['results']:
+        before = reference.get(key(entry))
+        if before is None or entry['status'] != 'ok':
+            continue
+        for field in ('seconds', 'peak_memory'):
+            if entry[field] > before[field] * (1 + threshold):
+                regressions.append({'name': entry['name'], 'size': entry['size'], 'dtype': entry['dtype'],
+                                    'channels': entry['channels'], 'field': field, 'old': before[field],
+                                    'new': entry[field], 'change': entry[field] / before[field] - 1})
+    return regressions
+
+
+def main(argv=None):
+    """
+    Command line interface.
+        python -m Common.benchmark run [--grid full] [--select FFT] [--output results.json]
+        python -m Common.benchmark compare old.json new.json [--threshold 0.1]
+    The compare command exits with status 1 when a regression is found.
+    :param argv: (list) command line arguments. By default sys.argv is used.
+    :return: (int) exit status.
+    """
+    parser = argparse.ArgumentParser(prog='python -m Common.benchmark',
+                                     description='Benchmark of the Common algorithms against NumPy/SciPy.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='time every entry point and store the results as JSON')
+    run_parser.add_argument('--grid', choices=sorted(SIZES), default='quick')
+    run_parser.add_argument('--select', help='only run the cases whose name contains this string')
+    run_parser.add_argument('--min-time', type=float, default=MIN_TIME)
+    run_parser.add_argument('--output', help='path of the JSON results')
+    compare_parser = commands.add_parser('compare', help='flag regressions between two JSON results')
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        run(args.grid, args.select, args.min_time, args.output)
+        return 0
+
+    regressions = compare(args.old, args.new, args.threshold)
+    for r in regressions:
+        print('{name} size={size} {dtype} channels={channels}: {field} {old:.4g} -> {new:.4g} '
+              '(+{change:.0%})'.format(**r))
+    print('{} regression(s) above {:.0%}'.format(len(regressions), args.threshold))
+    return 1 if regressions else 0
+
+
+def _cold_fft(transform, x):
+    """
+    Function that calculates an FFT without cached plans, as the first call for a new size does.
+    :param transform: (FFT) FFT object.
+    :param x: (numpy array) input signal.
+    :return: (numpy array) one sided FFT of x.
+    """
+    fft.clear_plan_cache()
+    return transform.fft(x)
+
+
+def _load(report):
+    """
+    Function that loads a benchmark report.
+    :param report: (string or dict) path of the JSON file, or the report itself.
+    :return: (dict) report.
+    """
+    if isinstance(report, dict):
+        return report
+    with open(report) as f:
+        return json.load(f)
+
+
+def _format(entry):
+    """
+    Function that formats a benchmark result as one line of text.
+    :param entry: (dict) result of one case.
+    :return: (string) formatted result.
+    """
+    head = '{:<40} {:>8} {:<8} {:>2}ch'.format(entry['name'], entry['size'], entry['dtype'], entry['channels'])
+    if entry['status'] != 'ok':
+        return '{}  {}'.format(head, entry['status'])
+    return '{}  {:9.3f} ms  {:8.2f} MS/s  {:8.2f} MB  x{:.2f} baseline'.format(
+        head, entry['seconds'] * 1e3, entry['throughput'] / 1e6, entry['peak_memory'] / 2 ** 20, entry['ratio'])
+
+
+if __name__ == '__main__':
+    sys.exit(main())
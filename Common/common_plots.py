@@ -2,16 +2,22 @@ import numpy as np
 import matplotlib.pyplot as plt
 
 
+# Number of points used to draw the unit circle of the zero-pole plots.
+UNIT_CIRCLE_POINTS = 512
+
+
 class Plot:
 
     def __init__(self):
         pass
 
-    def plot_multiple(self, signal):
+    def plot_multiple(self, signal, decimation='auto'):
         """
         Function that plots a impulse/step decomposition of a signal.
         :param signal: (numpy array) square matrix of impulse/step decomposition where each row 
         represents a single impulse/step decomposition of each n-th sample.
+        :param decimation: (string) reduction applied to long rows before drawing them, see plot_single. Reduced
+                rows are drawn as lines instead of stems.
         :return: None
         """
 
@@ -29,9 +35,13 @@ class Plot:
             M = N
 
         for i in range(M):
-            plt.subplot(int(M / 2), 2, i + 1)
+            ax = plt.subplot(int(M / 2), 2, i + 1)
             try:
-                plt.stem(signal[i], use_line_collection=True);
+                n, x = reduce_for_plot(signal[i], ax, decimation)
+                if n is None:
+                    plt.stem(signal[i])
+                else:
+                    plt.plot(n, x)
                 plt.ylim((y_min, y_max))
                 plt.title("Sample: {}".format(i))
                 plt.grid()
@@ -39,20 +49,31 @@ class Plot:
                 pass
         return
 
-    def plot_single(self, signal, title="Signal", style='stem'):
+    def plot_single(self, signal, title="Signal", style='stem', decimation='auto'):
         """
         Function that plots stem of a given signal.
         :param signal: (numpy array) array of numbers to be plotted.
         :param title: (string) title to be used, by default "Signal" is used.
-        :param style: (string)
+        :param style: (string) 'stem' or 'line'.
+        :param decimation: (string) reduction applied to long signals before drawing them, so the plot time
+                does not depend on the signal length. 'envelope' draws the minimum and maximum of the samples
+                that fall on each pixel of the axes, so peaks are drawn exactly. 'lttb' keeps two points per
+                pixel with the largest triangle three buckets algorithm, which follows the shape of smooth
+                signals. 'auto' uses 'envelope' for signals longer than two samples per pixel, and None always
+                draws every sample. Reduced signals are always drawn as lines, whatever the style, so with the
+                default 'auto' a stem plot of more than about 1550 samples on the default 10x5 figure becomes
+                a line plot; use decimation=None to keep the stems of a long signal.
         :return: None
         """
         delta = 1
 
         plt.rcParams["figure.figsize"] = (10, 5)
 
-        if style == 'stem':
-            plt.stem(signal[0], use_line_collection=True)
+        n, x = reduce_for_plot(signal[0], plt.gca(), decimation)
+        if n is not None:
+            plt.plot(n, x)
+        elif style == 'stem':
+            plt.stem(signal[0])
         elif style == 'line':
             plt.plot(signal[0])
 
@@ -66,7 +87,7 @@ class Plot:
         plt.title(title)
         plt.grid()
         return
-    
+
     def plot_three_signals(self, x1, x2, x3, titles=('x1', 'x2', 'x3'), labels=('sample', 'sample', 'sample')):
         """
         Funtion that allows to plot three signals at the same time.
@@ -134,20 +155,95 @@ class Plot:
 
         """
         ax = plt.subplot(133)
-        x = np.arange(-1, 1, 0.00001)
-        y = np.zeros(len(x))
-        ax.plot(x, np.sqrt(1 - x ** 2), 'black')
-        ax.plot(x, -np.sqrt(1 - x ** 2), 'black')
+        theta = np.linspace(0, 2 * np.pi, UNIT_CIRCLE_POINTS)
+        ax.plot(np.cos(theta), np.sin(theta), 'black')
         ax.plot(np.real(z), np.imag(z), 'bo', fillstyle='none', markersize=12)
         ax.plot(np.real(p), np.imag(p), 'rx', markersize=12)
-        ax.grid(b=True, which='major')
-        axis_x = np.arange(-1.5, 1.5, 0.00001)
-        axis_y = np.zeros(len(axis_x))
-        ax.plot(axis_x, axis_y, 'gray')
-        ax.plot(axis_y, axis_x, 'gray')
+        ax.grid(True, which='major')
+        ax.plot([-1.5, 1.5], [0, 0], 'gray')
+        ax.plot([0, 0], [-1.5, 1.5], 'gray')
         ax.set_xlim([-1.5, 1.5])
         ax.set_ylim([-1.5, 1.5])
         plt.xlabel('Re')
         plt.ylabel('Im')
         return
 
+
+
+def reduce_for_plot(x, ax, decimation='auto'):
+    """
+    Function that reduces a signal to the resolution of the axes where it is drawn.
+    :param x: (numpy array) 1-D signal.
+    :param ax: (matplotlib axes) axes where the signal is drawn. Their width in pixels sets the resolution.
+    :param decimation: (string) 'envelope', 'lttb', 'auto' or None, see Plot.plot_single.
+    :return: n (numpy array) sample numbers of the reduced signal, or None if the signal is not reduced.
+             x (numpy array) values of the reduced signal.
+    """
+    x = np.ravel(x)
+    if decimation is None:
+        return None, x
+    pixels = max(1, int(ax.get_window_extent().width))
+    if decimation == 'auto':
+        if x.shape[0] <= 2 * pixels:
+            return None, x
+        decimation = 'envelope'
+    if decimation == 'envelope':
+        return envelope(x, pixels)
+    elif decimation == 'lttb':
+        return lttb(x, 2 * pixels)
+    raise ValueError("Unknown decimation '{}', use 'envelope', 'lttb', 'auto' or None".format(decimation))
+
+
+def envelope(x, bins):
+    """
+    Function that reduces a signal to the minimum and maximum of each of a number of consecutive bins.
+    Drawn as a line, the envelope covers the same vertical extent as the whole signal at every pixel, so
+    peaks and glitches are never lost.
+    :param x: (numpy array) 1-D signal.
+    :param bins: (int) number of bins, usually the width of the plot in pixels.
+    :return: n (numpy array) sample number of the start of each bin, repeated for its minimum and maximum.
+             x (numpy array) minimum and maximum of each bin, of size 2*bins.
+    """
+    x = np.ravel(x)
+    N = x.shape[0]
+    if N <= 2 * bins:
+        return np.arange(N), x
+    starts = np.arange(bins) * N // bins
+    values = np.empty(2 * bins, dtype=x.dtype)
+    values[0::2] = np.minimum.reduceat(x, starts)
+    values[1::2] = np.maximum.reduceat(x, starts)
+    return np.repeat(starts, 2), values
+
+
+def lttb(x, points):
+    """
+    Function that reduces a signal with the largest triangle three buckets algorithm. The samples between
+    the first and the last one are split in points-2 buckets and, bucket by bucket, the sample that forms
+    the largest triangle with the previously kept sample and the mean of the next bucket is kept.
+    :param x: (numpy array) 1-D signal.
+    :param points: (int) number of samples kept, at least 3.
+    :return: n (numpy array) sample numbers of the kept samples.
+             x (numpy array) kept samples.
+    """
+    x = np.ravel(x)
+    N = x.shape[0]
+    if points >= N or points < 3:
+        return np.arange(N), x
+
+    edges = np.linspace(1, N - 1, points - 1).astype(int)
+    counts = np.diff(edges)
+    mean_n = edges[:-1] + (counts - 1) / 2
+    mean_x = np.add.reduceat(x[:N - 1], edges[:-1]) / counts
+    mean_n = np.append(mean_n, N - 1)
+    mean_x = np.append(mean_x, x[-1])
+
+    kept = np.empty(points, dtype=np.int64)
+    kept[0] = 0
+    kept[-1] = N - 1
+    a = 0
+    for i in range(points - 2):
+        n = np.arange(edges[i], edges[i + 1])
+        area = np.abs((a - mean_n[i + 1]) * (x[n] - x[a]) - (a - n) * (mean_x[i + 1] - x[a]))
+        a = edges[i] + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept, x[kept]
@@ -1,6 +1,39 @@
 import numpy as np
 from scipy.linalg import toeplitz
+from Common import fft
+from Common import profiling
 
+
+# Upper bound on the number of samples transformed at once by the block FFT convolution. Blocks are
+# processed in batches of at most this many samples so memory stays bounded for arbitrarily long inputs.
+FFT_BATCH_SAMPLES = 2 ** 20
+
+
+def fft_block_size(M, N=None):
+    """
+    Function that selects the FFT size used by the block convolution for a kernel of length M. The size
+    is the power of two that minimizes the cost per output sample nfft*(log2(nfft)+1)/(nfft-M+1), where
+    nfft*log2(nfft) counts the transforms of a block and nfft the product of its spectrum with the kernel's.
+    :param M: (int) length of the filter kernel.
+    :param N: (int) length of the input signal. If given, the FFT size is not made larger than needed to
+            convolve the whole signal in a single block.
+    :return: (int) FFT size for the block convolution.
+    """
+    nfft = 1 << int(np.ceil(np.log2(max(2 * M - 1, 2))))
+    largest = 64 * nfft
+    if N is not None:
+        largest = min(largest, max(nfft, 1 << int(np.ceil(np.log2(N + M - 1)))))
+
+    best, best_cost = nfft, np.inf
+    while nfft <= largest:
+        cost = nfft * (np.log2(nfft) + 1) / (nfft - M + 1)
+        if cost < best_cost:
+            best, best_cost = nfft, cost
+        nfft *= 2
+    return best
+
+
+@profiling.profiled_methods
 class Convolve:
     
     def __init__(self):
@@ -55,6 +88,77 @@ class Convolve:
         
     
         return None
+
+
+    def fft_convolve(self, x, h, method='overlap_add', block_size=None, dtype=None):
+        """
+        Function that convolves an input signal x with an step response h using block FFT convolution.
+        The input is split in blocks that are transformed with an FFT of size block_size, so the cost is
+        O(N log M) and the memory used is bounded by the block size instead of the signal length.
+
+        Parameters:
+        x (numpy array): Array of numbers representing the input signal to be convolved.
+        h (numpy array): Array of numbers representing the unit step response of a filter.
+        method (string): String that selects the block algorithm. Can be `overlap_add` or `overlap_save`.
+                         Default value is `overlap_add`.
+        block_size (int): FFT size used for each block. Must be at least 2*M-1, where M is the length of h.
+                          If None, it is selected from the kernel length with `fft_block_size`.
+        dtype (numpy dtype): Precision of the convolution. By default it follows the inputs, see
+                             `fft.working_dtype`, so float32 signals and kernels give a float32 output.
+
+        Returns:
+        numpy array: Returns convolved signal y[n]=h[n]*x[n] of size N+M-1.
+
+        """
+        column = np.ndim(x) == 2
+        real = fft.working_dtype(x, h, dtype=dtype)
+        x = fft.to_precision(np.ravel(x), real)
+        h = fft.to_precision(np.ravel(h), real)
+        N = x.shape[0]
+        M = h.shape[0]
+
+        if block_size is None:
+            block_size = fft_block_size(M, N)
+        elif block_size < 2 * M - 1:
+            raise ValueError("block_size must be at least 2*M-1={}".format(2 * M - 1))
+
+        if method == 'overlap_add':
+            y = _overlap_add(x, h, block_size)
+        elif method == 'overlap_save':
+            y = _overlap_save(x, h, block_size)
+        else:
+            raise ValueError("Unknown method '{}', use 'overlap_add' or 'overlap_save'".format(method))
+
+        if column:
+            y = y.reshape(-1, 1)
+        return y
+
+
+    def convolve(self, x, h, algorithm='output'):
+        """
+        Function that convolves an input signal x with an step response h using the selected algorithm.
+
+        Parameters:
+        x (numpy array): Array of numbers representing the input signal to be convolved.
+        h (numpy array): Array of numbers representing the unit step response of a filter.
+        algorithm (string): String that selects the algoritm to use for finding the convolution.
+                            Can be `fast` if `conv1d` function is used, `input` if `convolve_input_algorithm`
+                            is used, `output` if `convolve_output_algorithm` is used, and `fft` if
+                            `fft_convolve` is used. Default value is `output`.
+
+        Returns:
+        numpy array: Returns convolved signal y[n]=h[n]*x[n].
+
+        """
+        if algorithm == 'fast':
+            return self.conv1d(x, h)
+        elif algorithm == 'input':
+            return self.convolve_input_algorithm(x, h)
+        elif algorithm == 'output':
+            return self.convolve_output_algorithm(x, h)
+        elif algorithm == 'fft':
+            return self.fft_convolve(x, h)
+        raise ValueError("Unknown algorithm '{}'".format(algorithm))
         
         
     def conv2d(self, image, kernel):
@@ -104,3 +208,97 @@ class Convolve:
             """
        
         return None
+
+
+def _block_transforms(x, h):
+    """
+    Function that selects the forward and inverse transforms for the block convolution. Real inputs use
+    the real FFT so that only half of the spectrum is computed.
+    :param x: (numpy array) input signal.
+    :param h: (numpy array) filter kernel.
+    :return: forward and inverse transform functions with signature f(a, n).
+    """
+    if np.iscomplexobj(x) or np.iscomplexobj(h):
+        return (lambda a, n: np.fft.fft(a, n)), (lambda a, n: np.fft.ifft(a, n))
+    return (lambda a, n: np.fft.rfft(a, n)), (lambda a, n: np.fft.irfft(a, n))
+
+
+def _overlap_add(x, h, nfft):
+    """
+    Function that implements the overlap-add block convolution.
+    :param x: (numpy array) 1-D input signal.
+    :param h: (numpy array) 1-D filter kernel.
+    :param nfft: (int) FFT size of each block.
+    :return: (numpy array) convolved signal of size N+M-1.
+    """
+    N = x.shape[0]
+    M = h.shape[0]
+    L = nfft - M + 1
+    n_blocks = -(-N // L)
+    forward, inverse = _block_transforms(x, h)
+    H = forward(h, nfft)
+
+    y = np.zeros((n_blocks + 1) * L, dtype=np.result_type(x, h))
+    x_pad = np.zeros(n_blocks * L, dtype=x.dtype)
+    x_pad[:N] = x
+    blocks = x_pad.reshape(n_blocks, L)
+
+    batch = max(1, FFT_BATCH_SAMPLES // nfft)
+    for k in range(0, n_blocks, batch):
+        Y = inverse(forward(blocks[k:k + batch], nfft) * H, nfft)
+        nb = Y.shape[0]
+        # Each block adds L samples in place and an M-1 tail into the head of the next block
+        y[k * L:(k + nb) * L].reshape(nb, L)[:] += Y[:, :L]
+        y[(k + 1) * L:(k + nb + 1) * L].reshape(nb, L)[:, :M - 1] += Y[:, L:]
+    return y[:N + M - 1]
+
+
+def _overlap_save(x, h, nfft):
+    """
+    Function that implements the overlap-save block convolution.
+    :param x: (numpy array) 1-D input signal.
+    :param h: (numpy array) 1-D filter kernel.
+    :param nfft: (int) FFT size of each block.
+    :return: (numpy array) convolved signal of size N+M-1.
+    """
+    N = x.shape[0]
+    M = h.shape[0]
+    L = nfft - M + 1
+    n_out = N + M - 1
+    n_blocks = -(-n_out // L)
+    forward, inverse = _block_transforms(x, h)
+    H = forward(h, nfft)
+
+    # Each block keeps the last M-1 input samples of the previous one as history
+    x_pad = np.zeros(n_blocks * L + M - 1, dtype=x.dtype)
+    x_pad[M - 1:M - 1 + N] = x
+
+    y = np.empty(n_blocks * L, dtype=np.result_type(x, h))
+    _overlap_save_blocks(x_pad, H, M, nfft, 0, n_blocks, y, forward, inverse)
+    return y[:n_out]
+
+
+def _overlap_save_blocks(x_pad, H, M, nfft, start, stop, y, forward, inverse):
+    """
+    Function that calculates a range of output blocks of the overlap-save block convolution. Blocks are
+    transformed in batches that start at multiples of the batch size, so any range that starts at such a
+    multiple gives exactly the same samples as calculating all blocks at once.
+    :param x_pad: (numpy array) input signal preceded by M-1 zeros and padded with zeros to a whole number
+            of blocks.
+    :param H: (numpy array) transform of the filter kernel of size nfft.
+    :param M: (int) length of the filter kernel.
+    :param nfft: (int) FFT size of each block.
+    :param start: (int) first block to calculate.
+    :param stop: (int) last block to calculate, not included.
+    :param y: (numpy array) output signal, block k is written to y[k*L:(k+1)*L] with L = nfft-M+1.
+    :param forward: forward transform function with signature f(a, n), see _block_transforms.
+    :param inverse: inverse transform function with signature f(a, n).
+    :return: None
+    """
+    L = nfft - M + 1
+    segments = np.lib.stride_tricks.sliding_window_view(x_pad, nfft)[::L]
+    batch = max(1, FFT_BATCH_SAMPLES // nfft)
+    for k in range(start, stop, batch):
+        Y = inverse(forward(segments[k:min(k + batch, stop)], nfft) * H, nfft)
+        y[k * L:(k + Y.shape[0]) * L] = Y[:, M - 1:].reshape(-1)
+    return
@@ -1,15 +1,19 @@
 import numpy as np
 from Common import convolution
+from Common import fft
+from Common import profiling
 
 
+@profiling.profiled_methods
 class Correlation():
     
     def __init__(self):
         self.convolve = convolution.Convolve()
-        pass
+        self.r = None
+        self.zero_lag = None
     
     
-    def correlation(self, x, h, algorithm='output'):
+    def correlation(self, x, h, algorithm='output', max_lag=None):
         """ 
         Function that finds the correlation of an input signal x with an step response h.
         Parameters: 
@@ -17,37 +21,56 @@ class Correlation():
         h (numpy array): Array of numbers representing the unit step response of a filter or signal.
         algorithm (string): String that selects the algoritm to use for finding the convolution.
                             Can be `fast` if `conv1d` function is used, `input` if `convolve_input_algorithm`
-                            is used, and `output` if `convolve_output_algorithm` is used. Default value is
-                            `output`.
+                            is used, `output` if `convolve_output_algorithm` is used, and `fft` if
+                            `fft_convolve` is used. Default value is `output`.
+        max_lag (int): If given, only the lags between -max_lag and max_lag are calculated. With the
+                       `fft` algorithm the full correlation is never built: the input is processed in
+                       blocks whose FFT size depends on max_lag, not on the signal length.
 
         Returns: 
-        numpy array: Returns correlation r_xh[n]=x[n]*h[-n].
+        numpy array: Returns correlation r_xh[n]=x[n]*h[-n]. If max_lag is given, only the 2*max_lag+1
+                     values around lag zero are returned.
 
         """
-        
-            
-        return None
+        column = np.ndim(x) == 2
+        M = np.shape(h)[0]
+        if max_lag is not None and algorithm == 'fft':
+            r = _lag_limited_correlation(np.ravel(x), np.ravel(h), max_lag)
+            if column:
+                r = r.reshape(-1, 1)
+            self.zero_lag = max_lag
+        else:
+            r = self.convolve.convolve(x, np.conj(np.flip(h, axis=0)), algorithm)
+            self.zero_lag = M - 1
+            if max_lag is not None:
+                r = _lag_window(r, M - 1, max_lag)
+                self.zero_lag = max_lag
+
+        self.r = r
+        return r
     
     
-    def auto_corr(self, x, algorithm='output'):
+    def auto_corr(self, x, algorithm='output', max_lag=None):
         """ 
         Function that finds the auto correlation of an input signal x.
         Parameters: 
         x (numpy array): Array of numbers representing the input signal to be auto correlated.
         algorithm (string): String that selects the algoritm to use for finding the convolution.
                             Can be `fast` if `conv1d` function is used, `input` if `convolve_input_algorithm`
-                            is used, and `output` if `convolve_output_algorithm` is used. Default value is
-                            `output`.
+                            is used, `output` if `convolve_output_algorithm` is used, and `fft` if
+                            `fft_convolve` is used. Default value is `output`.
+        max_lag (int): If given, only the lags between -max_lag and max_lag are calculated. With the
+                       `fft` algorithm the full correlation is never built: the input is processed in
+                       blocks whose FFT size depends on max_lag, not on the signal length.
 
         Returns: 
         numpy array: Returns auto correlation r_xx[n]=x[n]*x[-n].
 
         """
-        
-        return None
+        return self.correlation(x, x, algorithm, max_lag)
     
     
-    def norm_correlation(self, x, h, algorithm='output'):
+    def norm_correlation(self, x, h, algorithm='fft', max_lag=None):
         """ 
         Function that finds the normalized correlation of an input signal x with an step response h.
         Parameters: 
@@ -55,47 +78,151 @@ class Correlation():
         h (numpy array): Array of numbers representing the unit step response of a filter or signal.
         algorithm (string): String that selects the algoritm to use for finding the convolution.
                             Can be `fast` if `conv1d` function is used, `input` if `convolve_input_algorithm`
-                            is used, and `output` if `convolve_output_algorithm` is used. Default value is
-                            `output`.
+                            is used, `output` if `convolve_output_algorithm` is used, and `fft` if
+                            `fft_convolve` is used. Default value is `fft`, since the direct algorithms of
+                            Convolve are not implemented yet.
+        max_lag (int): If given, only the lags between -max_lag and max_lag are calculated. With the
+                       `fft` algorithm the full correlation is never built: the input is processed in
+                       blocks whose FFT size depends on max_lag, not on the signal length.
 
         Returns: 
         numpy array: Returns normalized correlation y[n]=r_xh[n]/(sqrt(max(r_xx[n])*max(r_hh[n]))).
 
         """
-        
-        return None
+        # The maximum of an auto correlation is its value at lag zero, the energy of the signal
+        r_xx_max = np.sum(np.abs(x) ** 2)
+        r_hh_max = np.sum(np.abs(h) ** 2)
+        return _checked(self.correlation(x, h, algorithm, max_lag), algorithm) / np.sqrt(r_xx_max * r_hh_max)
     
     
-    def norm_auto_corr(self, x, algorithm='output'):
+    def norm_auto_corr(self, x, algorithm='fft', max_lag=None):
         """ 
         Function that finds the normalized auto correlation of an input signal x.
         Parameters: 
         x (numpy array): Array of numbers representing the input signal to be auto correlated.
         algorithm (string): String that selects the algoritm to use for finding the convolution.
                             Can be `fast` if `conv1d` function is used, `input` if `convolve_input_algorithm`
-                            is used, and `output` if `convolve_output_algorithm` is used. Default value is
-                            `output`.
+                            is used, `output` if `convolve_output_algorithm` is used, and `fft` if
+                            `fft_convolve` is used. Default value is `fft`, since the direct algorithms of
+                            Convolve are not implemented yet.
+        max_lag (int): If given, only the lags between -max_lag and max_lag are calculated. With the
+                       `fft` algorithm the full correlation is never built: the input is processed in
+                       blocks whose FFT size depends on max_lag, not on the signal length.
 
         Returns: 
         numpy array: Returns normalized auto correlation y[n]=r_xx[n]/max(r_xx[n]).
 
 
         """
-        
-        return None
+        return _checked(self.auto_corr(x, algorithm, max_lag), algorithm) / np.sum(np.abs(x) ** 2)
 
     
-    def delay(self):
+    def delay(self, refine=False):
         """ 
         Function that finds the lag between a signal x[n] with respect to the filter or signal h[n].
         Before invoking this function, self.correlation() must be invoked.
         Parameters: 
-        None
+        refine (boolean): If True the lag is refined to a fraction of a sample by fitting a parabola
+                          through the correlation peak and its two neighbours.
 
         Returns: 
         numpy value: Returns negative difference between maximum correlation index and (filter lenght - 1).
 
 
         """
-        return None
+        r = np.ravel(np.real(self.r))
+        peak = np.argmax(r)
+        offset = 0
+        if refine and 0 < peak < r.shape[0] - 1:
+            left, center, right = r[peak - 1], r[peak], r[peak + 1]
+            curvature = left - 2 * center + right
+            if curvature != 0:
+                offset = 0.5 * (left - right) / curvature
+        return -(peak + offset - self.zero_lag)
         
+
+
+def _checked(r, algorithm):
+    """
+    Function that checks that a correlation was calculated before it is normalized.
+
+    Parameters:
+    r (numpy array): Correlation returned by the selected algorithm.
+    algorithm (string): Name of the algorithm, used in the error message.
+
+    Returns:
+    numpy array: Returns r.
+
+    """
+    if r is None:
+        raise ValueError("The '{}' convolution algorithm is not implemented, use 'fft'".format(algorithm))
+    return r
+
+
+def _lag_window(r, zero_lag, max_lag):
+    """
+    Function that extracts the lags between -max_lag and max_lag from a full correlation, filling with
+    zeros the lags that fall outside of it.
+
+    Parameters:
+    r (numpy array): Full correlation.
+    zero_lag (int): Index of lag zero in r.
+    max_lag (int): Largest lag to keep.
+
+    Returns:
+    numpy array: Returns the 2*max_lag+1 values of the correlation around lag zero.
+
+    """
+    window = np.zeros((2 * max_lag + 1,) + r.shape[1:], dtype=r.dtype)
+    start = max(0, zero_lag - max_lag)
+    stop = min(r.shape[0], zero_lag + max_lag + 1)
+    window[start - (zero_lag - max_lag):stop - (zero_lag - max_lag)] = r[start:stop]
+    return window
+
+
+def _lag_limited_correlation(x, h, L):
+    """
+    Function that calculates the correlation r[lag] = sum(x[k]*conj(h[k-lag])) for the lags between -L and L
+    only. The signal x is split in blocks of B samples, and each block is correlated with the 
+    B+2L samples of h it can overlap, using an FFT whose size depends on L and not on the signal length.
+    The correlation is calculated in the precision of the inputs, see `fft.working_dtype`.
+
+    Parameters:
+    x (numpy array): 1-D input signal.
+    h (numpy array): 1-D filter or signal.
+    L (int): Largest lag to calculate.
+
+    Returns:
+    numpy array: Returns the correlation for the lags -L to L.
+
+    """
+    real = fft.working_dtype(x, h)
+    x = fft.to_precision(x, real)
+    h = fft.to_precision(h, real)
+    N = x.shape[0]
+    M = h.shape[0]
+    nfft = convolution.fft_block_size(2 * L + 1, N)
+    B = nfft - 2 * L
+    n_blocks = -(-N // B)
+    forward, inverse = convolution._block_transforms(x, h)
+
+    x_pad = np.zeros(n_blocks * B, dtype=x.dtype)
+    x_pad[:N] = x
+    blocks = x_pad.reshape(n_blocks, B)
+    # Segment k of h starts at sample k*B-L, so the padded copy is shifted by L
+    h_pad = np.zeros(n_blocks * B + 2 * L, dtype=h.dtype)
+    length = min(M, n_blocks * B + L)
+    h_pad[L:L + length] = h[:length]
+    segments = np.lib.stride_tricks.sliding_window_view(h_pad, B + 2 * L)[::B]
+
+    c = np.zeros(2 * L + 1, dtype=np.result_type(x, h))
+    batch = max(1, convolution.FFT_BATCH_SAMPLES // nfft)
+    for k in range(0, n_blocks, batch):
+        X = forward(blocks[k:k + batch], nfft)
+        H = forward(segments[k:k + batch], nfft)
+        d = inverse(np.sum(X * np.conj(H), axis=0), nfft)
+        # d[m] = sum(x[i+m]*conj(h[i])) holds the lag L+m, so lags -L to L are the circular indices -2L to 0
+        c[:2 * L] += d[nfft - 2 * L:]
+        c[2 * L] += d[0]
+    return c
+
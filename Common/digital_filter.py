@@ -1,8 +1,11 @@
 import numpy as np
 import scipy.signal
+from Common import fft
+from Common import profiling
 
 
-def filter_frequency_response(a, b, w=np.arange(0, np.pi, 0.1)):
+@profiling.profiled
+def filter_frequency_response(a, b, w=np.arange(0, np.pi, 0.1), method='auto', chunk_size=None):
     """
     Function that generates the frequency response of a digital filter given the coeficients of
     polynomials a0 + a_1*x + a_2*x^2 + ... and b0 + b_1*x + b_2*x^2 + ...
@@ -13,28 +16,45 @@ def filter_frequency_response(a, b, w=np.arange(0, np.pi, 0.1)):
     w (numpy array): Array of natural frequency values.
     a (numpy array): Array of recursion coefficients a.
     b (numpy array): Array of recursion coefficients b.
+    method (string): 'horner' evaluates the polynomials with Horner's scheme in O(N*order) time and O(N)
+    memory. 'fft' evaluates them on a uniform grid w[k] = 2*pi*(k0+k)/L with one FFT of size L of the
+    zero padded coefficients. 'auto' uses 'fft' when w is such a grid and the FFT is cheaper, and
+    'horner' otherwise.
+    chunk_size (int): If given, the response is evaluated in chunks of this many frequencies, so the
+    temporary arrays stay bounded for arbitrarily large grids. Only used by 'horner'.
 
     Returns:
     numpy array: Returns filter response.
 
     """
-    z = np.exp(1j * w)
+    a = np.asarray(a)
+    b = np.asarray(b)
+    w = np.asarray(w)
+    grid = _uniform_grid(w)
+    if method == 'auto':
+        use_fft = grid is not None and grid[0] * np.log2(max(grid[0], 2)) < w.shape[0] * (len(a) + len(b))
+        method = 'fft' if use_fft else 'horner'
 
-    a_degree = np.arange(0, len(a))
-    b_degree = np.arange(0, len(b))
+    if method == 'fft':
+        if grid is None:
+            raise ValueError("The 'fft' method needs a uniform grid w[k] = 2*pi*(k0+k)/L")
+        L, k0 = grid
+        index = (k0 + np.arange(w.shape[0])) % L
+        return _fft_polyval(a, L)[index] / _fft_polyval(b, L)[index]
+    elif method != 'horner':
+        raise ValueError("Unknown method '{}', use 'auto', 'horner' or 'fft'".format(method))
 
-    N = len(z)
-    na = len(a_degree)
-    nb = len(b_degree)
-
-    ZA = (np.repeat(z, na, axis=0)).reshape(N, na)
-    ZB = (np.repeat(z, nb, axis=0)).reshape(N, nb)
-
-    z_a = np.dot((ZA ** a_degree), a)
-    z_b = np.dot((ZB ** b_degree), b)
-    return z_a / z_b
+    N = w.shape[0]
+    if chunk_size is None:
+        chunk_size = max(N, 1)
+    H = np.empty(N, dtype=np.result_type(a, b, complex))
+    for start in range(0, N, chunk_size):
+        z = np.exp(1j * w[start:start + chunk_size])
+        H[start:start + chunk_size] = _horner(a, z) / _horner(b, z)
+    return H
 
 
+@profiling.profiled
 def zeros_poles_gain(a, b):
     """
     Function that calculates the zeros, poles and gain of a given transfer function which consists of
@@ -50,4 +70,216 @@ def zeros_poles_gain(a, b):
     g (numpy array): Gain of transfer function.
 
     """
-    return scipy.signal.tf2zpk(np.flip(a), np.flip(b))
\ No newline at end of file
+    return scipy.signal.tf2zpk(np.flip(a), np.flip(b))
+
+
+@profiling.profiled
+def tf2sos(a, b):
+    """
+    Function that converts a transfer function given by the coeficients of polynomials a0 + a_1*x + a_2*x^2 + ...
+    and b0 + b_1*x + b_2*x^2 + ... into a cascade of second-order sections. Running a high-order filter as a
+    cascade of second-order sections avoids the numerical problems of the direct form.
+
+    Parameters:
+    a (numpy array): Array of recursion coefficients a.
+    b (numpy array): Array of recursion coefficients b.
+
+    Returns:
+    numpy array: Returns an array of shape (n_sections, 6), where each row holds the numerator and the
+    denominator coefficients [b0, b1, b2, a0, a1, a2] of a section in powers of z^-1, as scipy.signal.sosfilt.
+
+    """
+    num, den = _negative_powers(a, b)
+    return scipy.signal.tf2sos(num, den)
+
+
+@profiling.profiled
+def sos_filter(sos, x, zi=None, axis=0):
+    """
+    Function that filters a signal with a cascade of second-order sections, using scipy.signal.sosfilt. All
+    channels are filtered at once, and the state of every section can be carried between calls to filter a
+    signal in chunks.
+
+    Parameters:
+    sos (numpy array): Array of second-order sections of shape (n_sections, 6), see tf2sos.
+    x (numpy array): Array of signal of interest.
+    zi (numpy array): Initial state of the sections, of shape (n_sections, ..., 2, ...) where the 2 is at
+    the position of axis and the other dimensions are those of x. If None, the filter starts at rest and
+    only the output is returned.
+    axis (int): Axis of x along which the filter is applied. By default axis 0 is used.
+
+    Returns:
+    y (numpy array): Returns filter response.
+    zf (numpy array): Returns final state of the sections. Only returned if zi is given.
+
+    """
+    return scipy.signal.sosfilt(np.atleast_2d(sos), x, axis=axis, zi=zi)
+
+
+@profiling.profiled
+def sos_filtfilt(sos, x, axis=0, padlen=None):
+    """
+    Function that applies a cascade of second-order sections forward and backward, which gives a zero-phase
+    response with the squared magnitude of the filter. The signal is extended at both ends with an odd
+    reflection and the sections start from their steady state, as in scipy.signal.sosfiltfilt.
+
+    Parameters:
+    sos (numpy array): Array of second-order sections of shape (n_sections, 6), see tf2sos.
+    x (numpy array): Array of signal of interest.
+    axis (int): Axis of x along which the filter is applied. By default axis 0 is used.
+    padlen (int): Number of samples of the odd extension at each end. By default 3 times the filter order.
+
+    Returns:
+    numpy array: Returns zero-phase filter response.
+
+    """
+    sos = np.atleast_2d(sos)
+    x = np.moveaxis(np.asarray(x), axis, -1)
+    if padlen is None:
+        trailing_zeros = min((sos[:, 2] == 0).sum(), (sos[:, 5] == 0).sum())
+        padlen = 3 * (2 * sos.shape[0] + 1 - trailing_zeros)
+    if x.shape[-1] <= padlen:
+        raise ValueError("The signal must have more than padlen={} samples".format(padlen))
+
+    start = 2 * x[..., :1] - x[..., padlen:0:-1]
+    end = 2 * x[..., -1:] - x[..., -2:-padlen - 2:-1]
+    extended = np.concatenate((start, x, end), axis=-1)
+
+    # Steady state of each section for a unit step, with the state dimension last
+    zi = scipy.signal.sosfilt_zi(sos).reshape((sos.shape[0],) + (1,) * (x.ndim - 1) + (2,))
+    y, _ = sos_filter(sos, extended, zi * extended[..., :1], axis=-1)
+    y, _ = sos_filter(sos, y[..., ::-1], zi * y[..., -1:], axis=-1)
+    y = y[..., ::-1][..., padlen:-padlen]
+    return np.moveaxis(y, -1, axis)
+
+
+@profiling.profiled_methods
+class SOSFilter():
+    def __init__(self, sos):
+        """
+        Class that filters a stream of chunks with a cascade of second-order sections, keeping the state of
+        every section between calls. The concatenated output of all chunks is the same as filtering the whole
+        signal in one pass.
+
+        Parameters:
+        sos (numpy array): Array of second-order sections of shape (n_sections, 6), see tf2sos.
+
+        """
+        self.sos = np.atleast_2d(sos)
+        self.zi = None
+        return
+
+    def reset(self):
+        """
+        Function that clears the state of the sections, so the next chunk starts a new signal.
+
+        Returns:
+        None
+
+        """
+        self.zi = None
+        return
+
+    def process(self, x, axis=0):
+        """
+        Function that filters a chunk of the input signal.
+
+        Parameters:
+        x (numpy array): Chunk of the input signal. Every axis but axis is treated as a channel.
+        axis (int): Axis of x along which the filter is applied. By default axis 0 is used.
+
+        Returns:
+        numpy array: Returns filter response of the chunk.
+
+        """
+        x = np.asarray(x)
+        if self.zi is None:
+            shape = list(x.shape)
+            shape[axis] = 2
+            self.zi = np.zeros([self.sos.shape[0]] + shape, dtype=np.result_type(x, self.sos))
+        y, self.zi = sos_filter(self.sos, x, self.zi, axis)
+        return y
+
+
+def _negative_powers(a, b):
+    """
+    Function that converts the polynomials a0 + a_1*x + a_2*x^2 + ... and b0 + b_1*x + b_2*x^2 + ... of a
+    transfer function into numerator and denominator coefficients in powers of z^-1, highest power of z first.
+
+    Parameters:
+    a (numpy array): Array of recursion coefficients a.
+    b (numpy array): Array of recursion coefficients b.
+
+    Returns:
+    num (numpy array): Numerator coefficients for powers z^0, z^-1, z^-2, ...
+    den (numpy array): Denominator coefficients for powers z^0, z^-1, z^-2, ...
+
+    """
+    n = max(len(a), len(b))
+    num = np.zeros(n, dtype=np.result_type(a, float))
+    den = np.zeros(n, dtype=np.result_type(b, float))
+    num[:len(a)] = a
+    den[:len(b)] = b
+    return np.flip(num), np.flip(den)
+
+
+def _horner(c, z):
+    """
+    Function that evaluates the polynomial c0 + c_1*z + c_2*z^2 + ... with Horner's scheme.
+
+    Parameters:
+    c (numpy array): Array of polynomial coefficients, lowest power first.
+    z (numpy array): Array of points where the polynomial is evaluated.
+
+    Returns:
+    numpy array: Returns value of the polynomial at each point.
+
+    """
+    p = np.full(z.shape, c[-1], dtype=np.result_type(c, z))
+    for coefficient in c[-2::-1]:
+        p *= z
+        p += coefficient
+    return p
+
+
+def _fft_polyval(c, L):
+    """
+    Function that evaluates the polynomial c0 + c_1*z + c_2*z^2 + ... at the L points z = exp(2j*pi*k/L) with
+    one FFT. Coefficients beyond L are folded, since exp(2j*pi*k*n/L) repeats every L powers.
+
+    Parameters:
+    c (numpy array): Array of polynomial coefficients, lowest power first.
+    L (int): Number of points on the unit circle.
+
+    Returns:
+    numpy array: Returns value of the polynomial at each of the L points.
+
+    """
+    c = np.asarray(c, dtype=complex)
+    folded = np.zeros(-(-len(c) // L) * L, dtype=complex)
+    folded[:len(c)] = c
+    folded = folded.reshape(-1, L).sum(axis=0)
+    return fft.FFT().ifft(folded, one_sided=False) * L
+
+
+def _uniform_grid(w):
+    """
+    Function that checks if the frequencies are a uniform grid w[k] = 2*pi*(k0+k)/L.
+
+    Parameters:
+    w (numpy array): Array of natural frequency values.
+
+    Returns:
+    tuple: Returns (L, k0) if w is a uniform grid, None otherwise.
+
+    """
+    if w.ndim != 1 or w.shape[0] < 2:
+        return None
+    step = w[1] - w[0]
+    if step <= 0:
+        return None
+    L = int(round(2 * np.pi / step))
+    k0 = int(round(w[0] * L / (2 * np.pi)))
+    if L < 1 or not np.allclose(w, 2 * np.pi * (k0 + np.arange(w.shape[0])) / L, rtol=0, atol=1e-9):
+        return None
+    return L, k0
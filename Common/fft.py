@@ -1,27 +1,325 @@
 import numpy as np
+from collections import OrderedDict
+from Common import profiling
 
 
+# Maximum number of FFT plans kept in memory. The least recently used plan is evicted first.
+PLAN_CACHE_SIZE = 32
+
+# Size of the DFT matrix used for the first stages of the radix-2 FFT.
+RADIX2_BASE_SIZE = 32
+
+_plan_cache = OrderedDict()
+_plan_cache_stats = {'hits': 0, 'misses': 0}
+
+
+class FFTPlan():
+    def __init__(self, n, one_sided=True, dtype=np.complex128):
+        """
+        Class that precomputes everything needed to transform signals of a fixed length n, so repeated
+        transforms of the same size skip all setup work. Power of two lengths use a vectorized iterative
+        radix-2 Cooley-Tukey FFT: a precomputed DFT matrix transforms the decimated subsequences of the
+        signal and precomputed twiddle factors combine them stage by stage. Other lengths use Bluestein's
+        algorithm on top of a power of two plan.
+        :param n: (int) length of the transform.
+        :param one_sided: (boolean) if True only the n//2+1 bins of the one sided spectrum are returned.
+                One sided plans of even length also precompute the tables of the real-input transform.
+        :param dtype: (numpy dtype) complex type used for the computation, complex64 or complex128.
+        """
+        self.n = int(n)
+        self.one_sided = one_sided
+        self.dtype = np.dtype(dtype)
+        self.radix2 = self.n & (self.n - 1) == 0
+
+        self.real = one_sided and self.n % 2 == 0
+        if self.real:
+            # A real signal of size n is packed into a complex signal of size n/2, z[m] = x[2m] + i*x[2m+1]
+            self.half = get_plan(self.n // 2, False, self.dtype)
+            self.real_twiddles = np.exp(-2j * np.pi * np.arange(self.n // 2 + 1) / self.n).astype(self.dtype)
+
+        if self.radix2:
+            self.n_min = min(self.n, RADIX2_BASE_SIZE)
+            k = np.arange(self.n_min)
+            self.dft_matrix = np.exp(-2j * np.pi * np.outer(k, k) / self.n_min).astype(self.dtype)
+            self.twiddles = []
+            rows = self.n_min
+            while rows < self.n:
+                self.twiddles.append(np.exp(-1j * np.pi * np.arange(rows) / rows).astype(self.dtype).reshape(-1, 1))
+                rows *= 2
+        else:
+            # Bluestein: X[k] = w[k] * sum(x[j]*w[j] * conj(w[k-j])), with the chirp w[k] = exp(-i*pi*k^2/n)
+            L = 1 << int(np.ceil(np.log2(2 * self.n - 1)))
+            k = np.arange(self.n)
+            self.chirp = np.exp(-1j * np.pi * ((k * k) % (2 * self.n)) / self.n).astype(self.dtype)
+            b = np.zeros(L, dtype=self.dtype)
+            b[:self.n] = np.conj(self.chirp)
+            b[L - self.n + 1:] = np.conj(self.chirp[1:])[::-1]
+            self.inner = get_plan(L, False, self.dtype)
+            self.B = self.inner.execute(b)
+        return
+
+    def execute(self, x, inverse=False):
+        """
+        Function that transforms the last axis of x.
+        :param x: (numpy array) input signal of shape (..., n).
+        :param inverse: (boolean) if True the inverse transform is computed, scaled by 1/n.
+        :return: (numpy array) transform of x. For one sided plans only the first n//2+1 bins of the
+                forward transform are returned.
+        """
+        x = np.asarray(x, dtype=self.dtype)
+        if inverse:
+            X = np.conj(self._forward(np.conj(x))) / self.n
+            return X.astype(self.dtype, copy=False)
+
+        X = self._forward(x)
+        if self.one_sided:
+            X = X[..., :self.n // 2 + 1]
+        return X
+
+    def execute_real(self, x):
+        """
+        Function that computes the one sided transform of the last axis of a real signal. The n real
+        samples are packed into a complex signal of size n/2, which is transformed and then split into the
+        spectra of the even and odd samples, halving the work and memory of the complex transform.
+        :param x: (numpy array) real input signal of shape (..., n).
+        :return: (numpy array) one sided transform of x of shape (..., n//2+1).
+        """
+        if not self.real:
+            raise ValueError("Real transforms need a one sided plan of even length")
+        real_dtype = np.finfo(self.dtype).dtype
+        z = np.ascontiguousarray(x, dtype=real_dtype).view(self.dtype)
+        Z = self.half.execute(z)
+        Z = np.concatenate((Z, Z[..., :1]), axis=-1)
+        Z_reversed = np.conj(Z[..., ::-1])
+        even = (Z + Z_reversed) / 2
+        odd = (Z - Z_reversed) / 2j
+        return even + self.real_twiddles * odd
+
+    def execute_real_inverse(self, X):
+        """
+        Function that rebuilds a real signal of size n from the last axis of its one sided transform.
+        :param X: (numpy array) one sided spectrum of shape (..., n//2+1).
+        :return: (numpy array) real signal of shape (..., n).
+        """
+        if not self.real:
+            raise ValueError("Real transforms need a one sided plan of even length")
+        X = np.asarray(X, dtype=self.dtype)
+        X_reversed = np.conj(X[..., ::-1])
+        even = (X + X_reversed)[..., :-1] / 2
+        odd = (X - X_reversed)[..., :-1] / (2 * self.real_twiddles[:-1])
+        z = np.ascontiguousarray(self.half.execute(even + 1j * odd, inverse=True))
+        return z.view(np.finfo(self.dtype).dtype)
+
+    def _forward(self, x):
+        """
+        Function that computes the full forward transform of the last axis of x.
+        :param x: (numpy array) input signal of shape (..., n) with the plan dtype.
+        :return: (numpy array) two sided transform of x.
+        """
+        if not self.radix2:
+            a = np.zeros(x.shape[:-1] + (self.inner.n,), dtype=self.dtype)
+            a[..., :self.n] = x * self.chirp
+            conv = self.inner.execute(self.inner.execute(a) * self.B, inverse=True)
+            return conv[..., :self.n] * self.chirp
+
+        # Row r of the reshaped signal holds the subsequence x[r], x[r+C], x[r+2C], ... with C = n/n_min
+        X = self.dft_matrix @ x.reshape(x.shape[:-1] + (self.n_min, self.n // self.n_min))
+        for twiddle in self.twiddles:
+            half = X.shape[-1] // 2
+            even = X[..., :half]
+            odd = twiddle * X[..., half:]
+            X = np.concatenate((even + odd, even - odd), axis=-2)
+        return X.reshape(x.shape)
+
+
+def get_plan(n, one_sided=True, dtype=np.complex128):
+    """
+    Function that returns the FFT plan for a given length, creating it on a cache miss. Plans are kept in
+    a least recently used cache of PLAN_CACHE_SIZE entries keyed by (n, one_sided, dtype).
+    :param n: (int) length of the transform.
+    :param one_sided: (boolean) if True the plan returns the one sided spectrum.
+    :param dtype: (numpy dtype) complex type used for the computation.
+    :return: (FFTPlan) plan for the given parameters.
+    """
+    key = (int(n), bool(one_sided), np.dtype(dtype))
+    plan = _plan_cache.get(key)
+    if plan is not None:
+        _plan_cache.move_to_end(key)
+        _plan_cache_stats['hits'] += 1
+        return plan
+
+    _plan_cache_stats['misses'] += 1
+    plan = FFTPlan(*key)
+    _plan_cache[key] = plan
+    while len(_plan_cache) > PLAN_CACHE_SIZE:
+        _plan_cache.popitem(last=False)
+    return plan
+
+
+def clear_plan_cache():
+    """
+    Function that removes all cached FFT plans and resets the cache counters.
+    :return: None
+    """
+    _plan_cache.clear()
+    _plan_cache_stats['hits'] = 0
+    _plan_cache_stats['misses'] = 0
+    return
+
+
+def plan_cache_info():
+    """
+    Function that reports the state of the FFT plan cache.
+    :return: (dict) number of cache hits, misses, cached plans and maximum cache size.
+    """
+    return {'hits': _plan_cache_stats['hits'], 'misses': _plan_cache_stats['misses'],
+            'size': len(_plan_cache), 'max_size': PLAN_CACHE_SIZE}
+
+
+def working_dtype(*arrays, dtype=None):
+    """
+    Function that selects the floating point precision used to process a set of arrays. This is the dtype
+    policy followed by Common: arrays are combined with the numpy promotion rules and integers are promoted
+    to at least single precision, so float32 and complex64 inputs, alone or mixed with int8 or int16 data,
+    are processed in single precision, and any float64 or wider integer input selects double precision.
+    Single precision keeps a relative error of about 1e-7*log2(N) for an FFT of size N, and about
+    1e-7*sqrt(N) for sums of N products such as the DFT or direct form convolution.
+    :param arrays: (numpy arrays) inputs of the computation.
+    :param dtype: (numpy dtype) if given, the precision of this dtype is used instead of the inputs' one.
+    :return: (numpy dtype) float32 or float64, the real type of the computation.
+    """
+    if dtype is not None:
+        return np.finfo(dtype).dtype
+    return np.finfo(np.result_type(*[np.asarray(a).dtype for a in arrays], np.float32)).dtype
+
+
+def to_precision(x, real):
+    """
+    Function that converts an array to a floating point precision, keeping real arrays real and complex
+    arrays complex. The array is not copied if it already has the right type.
+    :param x: (numpy array) input array.
+    :param real: (numpy dtype) real type of the precision, float32 or float64, as given by working_dtype.
+    :return: (numpy array) x with type real, or its complex counterpart if x is complex.
+    """
+    x = np.asarray(x)
+    if np.iscomplexobj(x):
+        return x.astype(np.result_type(real, np.complex64), copy=False)
+    return x.astype(real, copy=False)
+
+
+def _complex_dtype(x, dtype=None):
+    """
+    Function that selects the complex dtype used to transform x.
+    :param x: (numpy array) input signal.
+    :param dtype: (numpy dtype) precision requested by the caller, see working_dtype.
+    :return: (numpy dtype) complex64 for single precision and complex128 for double precision.
+    """
+    return np.result_type(working_dtype(x, dtype=dtype), np.complex64)
+
+
+@profiling.profiled_methods
 class FFT():
     def __init__(self):
-        return 
-    
-    def fft(self, x, one_sided=True):
+        return
+
+    def fft(self, x, one_sided=True, axis=0, dtype=None):
         """
         A vectorized, non-recursive version of the Cooley-Tukey FFT
         :param x: (numpy array) input signal.
         :param one_sided: (boolean) parameter to select between one sided spectrum if True or two sided
                 spectrum if False.
+        :param axis: (int) axis of x along which the FFT is computed. Every other axis is treated as an
+                independent channel and all channels are transformed in one call. By default axis 0 is
+                used, which transforms a 1-D signal or a column vector.
+        :param dtype: (numpy dtype) precision of the transform. By default it follows the input, see
+                working_dtype, so float32 signals give complex64 spectra.
         :return: (numpy array) one sided or two sided FFT of input signal x.
-        """ 
-        return None
-        
-    def ifft(self, x, one_sided=True):
+        """
+        x = np.asarray(x)
+        if one_sided and not np.iscomplexobj(x) and x.shape[axis] % 2 == 0:
+            return self.rfft(x, axis, dtype)
+
+        x = np.moveaxis(x, axis, -1)
+        X = get_plan(x.shape[-1], one_sided, _complex_dtype(x, dtype)).execute(x)
+        return np.moveaxis(X, -1, axis)
+
+    def ifft(self, x, one_sided=True, axis=0, dtype=None, n=None):
         """
         A vectorized, non-recursive version of the Cooley-Tukey IFFT
         :param x: (numpy array) input signal.
-        :param one_sided: (boolean) parameter to select between one sided spectrum reconstruction if True 
+        :param one_sided: (boolean) parameter to select between one sided spectrum reconstruction if True
                 or two sided spectrum reconstruction if False.
+        :param axis: (int) axis of x along which the IFFT is computed. Every other axis is treated as an
+                independent channel. By default axis 0 is used.
+        :param dtype: (numpy dtype) precision of the transform. By default it follows the input.
+        :param n: (int) size of the output signal. The spectrum is cropped or padded with zeros to fit it.
+                For a one sided spectrum it defaults to 2*(len(x)-1), so the size of odd length signals must
+                be given; for a two sided spectrum it defaults to len(x).
         :return: (numpy array) IFFT of input signal x.
         """
-        return None
+        x = np.asarray(x)
+        if one_sided:
+            return self.irfft(x, axis, dtype, n)
+
+        x = np.moveaxis(x, axis, -1)
+        if n is not None:
+            x = _fit(x, n)
+        y = get_plan(x.shape[-1], False, _complex_dtype(x, dtype)).execute(x, inverse=True)
+        return np.moveaxis(y, -1, axis)
+
+    def rfft(self, x, axis=0, dtype=None):
+        """
+        FFT of a real input signal of even length. The signal is packed into a complex signal of half the
+        size, so it needs about half the work and memory of the complex FFT.
+        :param x: (numpy array) real input signal.
+        :param axis: (int) axis of x along which the FFT is computed. By default axis 0 is used.
+        :param dtype: (numpy dtype) precision of the transform. By default it follows the input.
+        :return: (numpy array) one sided FFT of input signal x.
+        """
+        x = np.moveaxis(np.asarray(x), axis, -1)
+        X = get_plan(x.shape[-1], True, _complex_dtype(x, dtype)).execute_real(x)
+        return np.moveaxis(X, -1, axis)
+
+    def irfft(self, x, axis=0, dtype=None, n=None):
+        """
+        IFFT that rebuilds a real signal from its one sided spectrum. Even lengths use the packed real
+        transform, odd lengths rebuild the two sided spectrum from its symmetry.
+        :param x: (numpy array) one sided spectrum of size N/2+1.
+        :param axis: (int) axis of x along which the IFFT is computed. By default axis 0 is used.
+        :param dtype: (numpy dtype) precision of the transform. By default it follows the input.
+        :param n: (int) size N of the output signal. The spectrum is cropped or padded with zeros to N/2+1
+                bins. By default N = 2*(len(x)-1), which is only right for signals of even length, so the
+                size of odd length signals must be given.
+        :return: (numpy array) real signal of size N.
+        """
+        x = np.moveaxis(np.asarray(x), axis, -1)
+        if n is None:
+            n = 2 * (x.shape[-1] - 1)
+            if n < 1:
+                raise ValueError("A one sided spectrum of {} bins needs the signal size n".format(x.shape[-1]))
+        elif n < 1:
+            raise ValueError("Invalid signal size n={}".format(n))
+        x = _fit(x, n // 2 + 1)
+
+        if n % 2 == 0:
+            y = get_plan(n, True, _complex_dtype(x, dtype)).execute_real_inverse(x)
+        else:
+            full = np.concatenate((x, np.conj(x[..., :0:-1])), axis=-1)
+            y = get_plan(n, False, _complex_dtype(x, dtype)).execute(full, inverse=True).real
+        return np.moveaxis(y, -1, axis)
+
 
+def _fit(x, n):
+    """
+    Function that crops or pads with zeros the last axis of x to n samples.
+    :param x: (numpy array) input array.
+    :param n: (int) size of the last axis.
+    :return: (numpy array) x with n samples in the last axis. x itself is returned if it already fits.
+    """
+    if x.shape[-1] == n:
+        return x
+    if x.shape[-1] > n:
+        return x[..., :n]
+    padded = np.zeros(x.shape[:-1] + (n,), dtype=x.dtype)
+    padded[..., :x.shape[-1]] = x
+    return padded
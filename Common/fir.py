@@ -1,7 +1,25 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
 import numpy as np
 import matplotlib.pyplot as plt
+from Common import convolution
+from Common import fft
+from Common import profiling
+from Common import windows
+
+
+# Kernels up to this length are applied in direct form, longer kernels use block FFT convolution.
+DIRECT_FORM_MAX_TAPS = 64
 
+# Default number of filter designs kept in memory by CachedFIR.
+DESIGN_CACHE_SIZE = 128
 
+
+@profiling.profiled_methods
 class FIR():
     def __init__(self):
         return
@@ -12,33 +30,41 @@ class FIR():
         :param fc: (float) cut-off frequency for the low-pass filter. Between 0 and 0.5.
         :param M: (int) length of the filter kernel. Usually M = 4/BW, where BW is the filter
                 bandwidth of the transition band.
-        :return: (numpy array) sinc shifted time domain response.
-        """     
-        return None
+        :return: (numpy array) sinc shifted time domain response, centered on the sample M//2.
+        """
+        x = np.arange(0, M, 1)
+        # np.sinc(t) = sin(pi*t)/(pi*t), which takes the value 2*fc at the center x = M//2. The center is
+        # a whole sample for odd and even M, so spectral_inversion adds its impulse on the same sample
+        return 2 * fc * np.sinc(2 * fc * (x - M // 2))
         
     
-    def hamming_window(self, M):
+    def hamming_window(self, M, symmetric=False):
         """
         Function that calculates a Hamming window of a given M-kernel.
         :param M: (int) Length of the filter kernel. Usually M = 4/BW, where BW is the filter
                 bandwidth of the transition band.
-        :return: (numpy array) Hamming window of a given M-kernel.
+        :param symmetric: (boolean) if False the periodic window, which peaks at sample M/2, is returned.
+                If True the symmetric window, which peaks at sample (M-1)/2, is returned.
+        :return: (numpy array) Hamming window of a given M-kernel. The window is shared through the window
+                registry and is read-only.
         """
-            
-        return None
+        return windows.get_window('hamming', M, symmetric=symmetric)
     
     
-    def blackman_window(self, M):
+    def blackman_window(self, M, symmetric=False):
         """
         Function that calculates a Blackman window of a given M-kernel.
         :param M: (int) Length of the filter kernel. Usually M = 4/BW, where BW is the filter
                 bandwidth of the transition band.
-        :return: (numpy array) Blackman window of a given M-kernel.
+        :param symmetric: (boolean) if False the periodic window, which peaks at sample M/2, is returned.
+                If True the symmetric window, which peaks at sample (M-1)/2, is returned.
+        :return: (numpy array) Blackman window of a given M-kernel. The window is shared through the window
+                registry and is read-only.
         """
-        return None
+        return windows.get_window('blackman', M, symmetric=symmetric)
         
     
-    def window_filter(self, fc, M, normalized=True, window_type='hamming'):
+    def window_filter(self, fc, M, normalized=True, window_type='hamming', dtype=np.float64):
         """
         Function to calculate the window filter based on the product of an window and a sinc function.
         :param fc: (float) cut-off frequency of a low pass filter
@@ -46,10 +72,26 @@ class FIR():
                 bandwidth of the transition band.
         :param normalized: (boolean) parameter to set normalized output, by default is set to True.
         :param window_type: (string) window to use, can be 'hamming' for Hamming window or 'blackman' for
-                Blackman window. By default 'hamming' is used.
+                Blackman window. Any other cosine window of the window registry, such as 'hann' or
+                'flattop', can also be used. By default 'hamming' is used.
+        :param dtype: (numpy dtype) type of the coefficients. The design is always calculated in double
+                precision and rounded at the end, so float32 kernels are accurate to about 1e-7.
         :return: (numpy array) filter of sinc and window functions of a given M-kernel.
         """
-        return None
+        # The window must peak on the center of the sinc, sample M//2: the periodic window does for even M
+        # and the symmetric window for odd M
+        symmetric = M % 2 == 1
+        if window_type == 'hamming':
+            window = self.hamming_window(M, symmetric)
+        elif window_type == 'blackman':
+            window = self.blackman_window(M, symmetric)
+        else:
+            window = windows.get_window(window_type, M, symmetric=symmetric)
+
+        h = self.shifted_sinc(fc, M) * window
+        if normalized:
+            h = h / np.sum(h)
+        return h.astype(dtype, copy=False)
        
     
     def spectral_reversal(self, x):
@@ -58,19 +100,22 @@ class FIR():
         :param x: (numpy array) filter of sinc and window functions of a given M-kernel to be spectral reversed.
         :return: (numpy array) filter of a spectral reversed sinc and window functions of a given M-kernel.
         """
-        
-        return None
+        return x * (-1.0) ** np.arange(len(x))
     
     def spectral_inversion(self, x):
         """
         Function that implements the spectral inversion algorithm.
         :param x: (numpy array) filter of sinc and window functions of a given M-kernel to be spectral inverted.
         :return: (numpy array) filter of a spectral inverted sinc and window functions of a given M-kernel.
-        """      
-        return None
+        """
+        x_invert = -np.asarray(x)
+        # Center of the kernels of shifted_sinc
+        center = len(x) // 2
+        x_invert[center] = x_invert[center] + 1
+        return x_invert
         
     
-    def low_pass_filter(self, fc, M, window_type='blackman', normalized=True):
+    def low_pass_filter(self, fc, M, window_type='blackman', normalized=True, dtype=np.float64):
         """
         Function that calculates a low pass FIR filter.
         :param fc: (float) cut-off frequency for the low pass filter.
@@ -79,12 +124,14 @@ class FIR():
         :param window_type: (string) window to use, can be 'hamming' for Hamming window or 'blackman' for
                 Blackman window. By default 'hamming' is used.
         :param normalized: (boolean) parameter to set normalized output, by default is set to True.
+        :param dtype: (numpy dtype) type of the coefficients, see window_filter. By default float64 is used.
         :return: (numpy array) coefficients of a low pass FIR filter of size M.
         """
-        return None
+        return self.window_filter(fc, M, normalized=normalized, window_type=window_type, dtype=dtype)
         
     
-    def high_pass_filter(self, fc, M, method='spectral_inversion', window_type='blackman', normalized=True):
+    def high_pass_filter(self, fc, M, method='spectral_inversion', window_type='blackman', normalized=True,
+                         dtype=np.float64):
         """
         Function that calculates a high pass FIR filter.
         :param fc: (float) cut-off frequency for the high pass filter.
@@ -95,13 +142,20 @@ class FIR():
         :param window_type: (string) window to use, can be 'hamming' for Hamming window or 'blackman' for
                 Blackman window. By default 'hamming' is used.
         :param normalized: (boolean) parameter to set normalized output, by default is set to True.
+        :param dtype: (numpy dtype) type of the coefficients, see window_filter. By default float64 is used.
         :return: (numpy array) coefficients of a high pass FIR filter of size M.
         """
-        return None
+        if method == 'spectral_inversion':
+            h = self.spectral_inversion(self.low_pass_filter(fc, M, window_type, normalized))
+        elif method == 'spectral_reversal':
+            h = self.spectral_reversal(self.low_pass_filter(0.5 - fc, M, window_type, normalized))
+        else:
+            raise ValueError("Unknown method '{}'".format(method))
+        return h.astype(dtype, copy=False)
         
     
     def band_filter(self, fc1, fc2, M, band_type='pass', method='spectral_inversion',
-                    window_type='hamming', normalized=True):
+                    window_type='hamming', normalized=True, dtype=np.float64):
         """
         Function that calculates a band/reject pass FIR filter.
         :param fc1: (float) cut-off frequency for the filter.
@@ -115,8 +169,264 @@ class FIR():
         :param window_type: (string) window to use, can be 'hamming' for Hamming window or 'blackman' for
                 Blackman window. By default 'hamming' is used.
         :param normalized: (boolean) parameter to set normalized output, by default is set to True.
+        :param dtype: (numpy dtype) type of the coefficients, see window_filter. By default float64 is used.
         :return: (numpy array) coefficients of a band pass (if method='pass') or a reject band
                 (if method='reject') FIR filter of size M.
         """
-        
-        return None
+        # A band reject filter is the sum of a low pass at fc1 and a high pass at fc2, and its spectral
+        # inversion is the band pass filter
+        reject = (self.low_pass_filter(fc1, M, window_type, normalized) +
+                  self.high_pass_filter(fc2, M, method, window_type, normalized))
+        if band_type == 'reject':
+            return reject.astype(dtype, copy=False)
+        elif band_type == 'pass':
+            return self.spectral_inversion(reject).astype(dtype, copy=False)
+        raise ValueError("Unknown band_type '{}'".format(band_type))
+
+
+@profiling.profiled_methods
+class CachedFIR(FIR):
+    def __init__(self, maxsize=DESIGN_CACHE_SIZE, cache_dir=None):
+        """
+        FIR filter designer that memoizes the design functions. Designs are keyed by the function name and
+        all its parameters, kept in a least recently used cache of maxsize entries and, optionally, saved as
+        .npy files in cache_dir so they survive restarts. Returned kernels are read-only, so a caller cannot
+        modify a kernel shared with other callers; use np.copy to get a writable kernel. A designer can be
+        shared by several threads: the cache is updated under a lock, while designs are calculated outside
+        of it, so a slow design does not block the hits of other threads.
+        :param maxsize: (int) maximum number of designs kept in memory.
+        :param cache_dir: (string) directory for the on-disk cache. If None, designs are only kept in memory.
+        """
+        super().__init__()
+        self.maxsize = maxsize
+        self.cache_dir = cache_dir
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Set while a thread calculates a design, so the designs it calls are not cached
+        self._local = threading.local()
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+        return
+
+    def shifted_sinc(self, fc, M):
+        """
+        Cached version of FIR.shifted_sinc, see FIR for the parameters.
+        :return: (numpy array) read-only filter kernel.
+        """
+        return self._cached('shifted_sinc', (fc, M))
+
+    def window_filter(self, fc, M, normalized=True, window_type='hamming', dtype=np.float64):
+        """
+        Cached version of FIR.window_filter, see FIR for the parameters.
+        :return: (numpy array) read-only filter kernel.
+        """
+        return self._cached('window_filter', (fc, M, normalized, window_type), dtype)
+
+    def low_pass_filter(self, fc, M, window_type='blackman', normalized=True, dtype=np.float64):
+        """
+        Cached version of FIR.low_pass_filter, see FIR for the parameters.
+        :return: (numpy array) read-only filter kernel.
+        """
+        return self._cached('low_pass_filter', (fc, M, window_type, normalized), dtype)
+
+    def high_pass_filter(self, fc, M, method='spectral_inversion', window_type='blackman', normalized=True,
+                         dtype=np.float64):
+        """
+        Cached version of FIR.high_pass_filter, see FIR for the parameters.
+        :return: (numpy array) read-only filter kernel.
+        """
+        return self._cached('high_pass_filter', (fc, M, method, window_type, normalized), dtype)
+
+    def band_filter(self, fc1, fc2, M, band_type='pass', method='spectral_inversion',
+                    window_type='hamming', normalized=True, dtype=np.float64):
+        """
+        Cached version of FIR.band_filter, see FIR for the parameters.
+        :return: (numpy array) read-only filter kernel.
+        """
+        return self._cached('band_filter', (fc1, fc2, M, band_type, method, window_type, normalized), dtype)
+
+    def cache_info(self):
+        """
+        Function that reports the state of the design cache.
+        :return: (dict) number of memory hits, disk hits, misses, cached designs and maximum cache size.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                    'size': len(self.cache), 'max_size': self.maxsize}
+
+    def clear_cache(self):
+        """
+        Function that removes all designs kept in memory and resets the counters. Files in cache_dir are kept.
+        :return: None
+        """
+        with self._lock:
+            self.cache.clear()
+            self.hits = 0
+            self.disk_hits = 0
+            self.misses = 0
+        return
+
+    def _cached(self, name, args, dtype=None):
+        """
+        Function that returns a cached design, calculating it with FIR on a miss. The designs called by
+        another design, such as window_filter inside low_pass_filter, are calculated directly, so a
+        request is cached once. Two threads that miss the same design at the same time both calculate it,
+        and the second one replaces the first in the cache.
+        :param name: (string) name of the design function.
+        :param args: (tuple) all the parameters of the design except dtype, in the order of its signature.
+        :param dtype: (numpy dtype) type of the kernel, or None for designs without a dtype parameter.
+        :return: (numpy array) read-only filter kernel.
+        """
+        design = getattr(FIR, name)
+        if dtype is not None:
+            args = args + (dtype,)
+        if getattr(self._local, 'designing', False):
+            return design(self, *args)
+
+        # Parameters are keyed by value, so np.float64(0.1) and 0.1 or np.float32 and 'float32' select the
+        # same design in memory and on disk
+        key = (name,) + tuple(_key_value(v) for v in args[:len(args) - (dtype is not None)])
+        if dtype is not None:
+            key += (np.dtype(dtype).name,)
+
+        with self._lock:
+            h = self.cache.get(key)
+            if h is not None:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return h
+
+        path = None
+        if self.cache_dir is not None:
+            digest = hashlib.sha1(repr(key).encode()).hexdigest()
+            path = os.path.join(self.cache_dir, '{}_{}.npy'.format(name, digest))
+        from_disk = path is not None and os.path.exists(path)
+        if from_disk:
+            h = np.load(path)
+        else:
+            self._local.designing = True
+            try:
+                h = np.array(design(self, *args))
+            finally:
+                self._local.designing = False
+            if path is not None:
+                _save_atomic(path, h)
+
+        h.setflags(write=False)
+        with self._lock:
+            if from_disk:
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+            self.cache[key] = h
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.maxsize:
+                self.cache.popitem(last=False)
+        return h
+
+
+def _key_value(v):
+    """
+    Function that converts a design parameter to a plain Python value with a stable repr, used to build the
+    cache keys.
+    :param v: parameter value.
+    :return: bool, int, float, string, or (dtype, shape, bytes) for arrays.
+    """
+    if isinstance(v, (bool, np.bool_)):
+        return bool(v)
+    if isinstance(v, (int, np.integer)):
+        return int(v)
+    if isinstance(v, (float, np.floating)):
+        return float(v)
+    if isinstance(v, np.ndarray):
+        return (v.dtype.str, v.shape, v.tobytes())
+    return v
+
+
+def _save_atomic(path, h):
+    """
+    Function that saves an array as a .npy file, writing to a temporary file first so that a concurrent
+    reader never sees a partial file.
+    :param path: (string) destination file.
+    :param h: (numpy array) array to save.
+    :return: None
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, h)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    return
+
+
+@profiling.profiled_methods
+class StreamingFIR():
+    def __init__(self, h, method='auto', dtype=None):
+        """
+        Class that applies an FIR filter kernel to a signal that arrives in chunks of arbitrary size. The
+        last M-1 input samples are kept between calls, so the concatenated output of all chunks is the same
+        as filtering the whole signal in one pass.
+        :param h: (numpy array) filter kernel of size M, for example the output of FIR.low_pass_filter.
+        :param method: (string) 'direct' for direct-form filtering, 'fft' for block FFT convolution or
+                'auto' to select 'direct' for kernels up to DIRECT_FORM_MAX_TAPS samples and 'fft' otherwise.
+        :param dtype: (numpy dtype) precision of the filter. The kernel is converted to it, so float32 chunks
+                give float32 outputs. By default the precision of the kernel is used.
+        """
+        self.h = fft.to_precision(np.ravel(h), fft.working_dtype(h, dtype=dtype))
+        self.M = self.h.shape[0]
+        if method == 'auto':
+            method = 'direct' if self.M <= DIRECT_FORM_MAX_TAPS else 'fft'
+        if method not in ('direct', 'fft'):
+            raise ValueError("Unknown method '{}', use 'direct', 'fft' or 'auto'".format(method))
+        self.method = method
+        self.convolve = convolution.Convolve()
+        self.reset()
+        return
+
+    def reset(self):
+        """
+        Function that clears the stored input history, so the next chunk starts a new signal.
+        :return: None
+        """
+        self.history = np.zeros(self.M - 1, dtype=self.h.dtype)
+        return
+
+    def process(self, x):
+        """
+        Function that filters a chunk of the input signal.
+        :param x: (numpy array) chunk of the input signal, as a 1-D array or a column vector.
+        :return: (numpy array) filtered samples, one for each sample of the chunk and with the same shape.
+        """
+        column = np.ndim(x) == 2
+        x = np.ravel(x)
+        n = x.shape[0]
+        buffer = np.concatenate((self.history, x))
+
+        if n == 0:
+            y = np.zeros(0, dtype=np.result_type(buffer, self.h))
+        elif self.method == 'direct':
+            frames = np.lib.stride_tricks.sliding_window_view(buffer, self.M)
+            y = frames @ self.h[::-1]
+        else:
+            y = self.convolve.fft_convolve(buffer, self.h)[self.M - 1:self.M - 1 + n]
+
+        self.history = buffer[buffer.shape[0] - (self.M - 1):]
+        if column:
+            y = y.reshape(-1, 1)
+        return y
+
+    def flush(self):
+        """
+        Function that returns the last M-1 output samples, produced by the stored history running out of
+        the filter, and resets the filter.
+        :return: (numpy array) last M-1 samples of the filtered signal.
+        """
+        y = self.process(np.zeros(self.M - 1, dtype=self.history.dtype))
+        self.reset()
+        return y
@@ -1,53 +1,155 @@
 import numpy as np
+import scipy.signal
+from collections import OrderedDict
+from Common import fft
+from Common import profiling
 
+
+# Maximum memory taken by the cached DFT basis matrices. The least recently used basis is evicted first.
+DFT_BASIS_CACHE_BYTES = 64 * 2 ** 20
+
+# Largest size transformed with the basis matrices by FourierTransform.dft, larger real signals use the FFT.
+DFT_FFT_THRESHOLD = 512
+
+_basis_cache = OrderedDict()
+_basis_cache_stats = {'hits': 0, 'misses': 0, 'bytes': 0}
+
+@profiling.profiled_methods
 class FourierTransform:
-    def __init__(self, signal, correct_arctan=True, correct_unwrap=True, domain='fraction', **kwargs):
+    def __init__(self, signal, correct_arctan=True, correct_unwrap=True, domain='fraction', axis=0, dtype=None,
+                 **kwargs):
         """
         Function that calculates the DFT of an input signal.
         Parameters:
         signal(numpy array): Array of numbers representing the input signal to be transformed.
         correct_arctan (boolean): If True arctan correction is performed.
         correct_unwrap (boolean): If True phase abiguity correction is performed.
+        domain (string): Style of the frequency domain's independent variable, see frequency_domain.
+        axis (int): Axis of the signal along which the DFT is computed. Every other axis is treated
+        as an independent channel. By default axis 0 is used.
+        dtype (numpy dtype): Precision of the DFT. By default it follows the signal, see fft.working_dtype,
+        so a float32 signal gives float32 rex, imx, magx and phasex.
         
         Attributes: 
-        signal (numpy array): Original input signal.
+        signal (numpy array): Original input signal. Assigning a new signal discards the cached attributes.
         N (int): Size of input signal.
         rex (numpy array): Real DFT part of input signal.
         imx (numpy array): Imaginary DFT part of input signal.
         magx (numpy array): Magnitude of the real and imaginary DFT.
         phasex (numpy array): Phase of the real and imaginary DFT.
-        domain (numpy array): Frequency domain's independent variable.        
+        domain (numpy array): Frequency domain's independent variable.
+
+        The attributes are calculated the first time they are read and cached, so reading only magx skips
+        the phase calculation, and rex, imx, magx and phasex share a single DFT. Modifying the signal in
+        place is not detected, assign it again to recalculate the attributes.
         """
-        
-        self.signal = None
-        self.N = None
-        self.rex, self.imx = None
-        self.magx = None
-        self.phasex = None
-        self.domain = None
+        self.axis = axis
+        self.dtype = dtype
+        self.correct_arctan = correct_arctan
+        self.correct_unwrap = correct_unwrap
+        self.domain_style = domain
+        self.kwargs = kwargs
+        self.signal = signal
         return
+
+    @property
+    def signal(self):
+        return self._signal
+
+    @signal.setter
+    def signal(self, signal):
+        self._signal = signal
+        self.N = signal.shape[self.axis]
+        self._cache = {}
+        return
+
+    @property
+    def rex(self):
+        return self._cached('rex')
+
+    @property
+    def imx(self):
+        return self._cached('imx')
+
+    @property
+    def magx(self):
+        return self._cached('magx')
+
+    @property
+    def phasex(self):
+        return self._cached('phasex')
+
+    @property
+    def domain(self):
+        return self._cached('domain')
+
+    def _cached(self, name):
+        """
+        Function that returns a cached attribute, calculating it on the first read.
+
+        Parameters:
+        name (string): 'rex', 'imx', 'magx', 'phasex' or 'domain'.
+
+        Returns:
+        numpy array: Value of the attribute.
+
+        """
+        if name not in self._cache:
+            if name in ('rex', 'imx'):
+                self._cache['rex'], self._cache['imx'] = self.dft(self._signal, self.axis, self.dtype)
+            elif name == 'magx':
+                self._cache['magx'] = self.dft_magnitude()
+            elif name == 'phasex':
+                self._cache['phasex'] = self.dft_phase(self.correct_arctan, self.correct_unwrap)
+            else:
+                self._cache['domain'] = self.frequency_domain(self.domain_style, **self.kwargs)
+        return self._cache[name]
         
         
-    def dft(self, x):
+    def dft(self, x, axis=0, dtype=None, method='auto'):
         """ 
         Function that calculates the DFT of an input signal x.
 
         Parameters: 
         x (numpy array): Array of numbers representing the input signal to be transformed.
+        axis (int): Axis of x along which the DFT is computed. Every other axis is treated as an
+        independent channel and all channels are transformed in one call.
+        dtype (numpy dtype): Precision of the DFT. By default it follows the input. The basis functions
+        are always calculated in double precision and rounded, so the single precision error is that
+        of the sums, about 1e-7*sqrt(N) relative to the signal energy.
+        method (string): 'correlation' to correlate x with the cosine and sine basis functions, which are
+        cached by size and dtype so repeated DFTs of the same size are a single matrix product, 'fft' to
+        use the FFT, or 'auto' to select 'correlation' up to DFT_FFT_THRESHOLD samples and 'fft' for
+        larger real signals. Both methods give the same rex and imx.
 
         Returns: 
         rex (numpy array): Real DFT part of input signal x
         imx (numpy array): Imaginary DFT part of input signal x
 
         """
+        real = fft.working_dtype(x, dtype=dtype)
+        x = np.moveaxis(fft.to_precision(x, real), axis, -1)
+        N = x.shape[-1]
+        if method == 'auto':
+            method = 'fft' if N > DFT_FFT_THRESHOLD and not np.iscomplexobj(x) else 'correlation'
+        if method == 'fft':
+            X = fft.FFT().fft(x, one_sided=True, axis=-1, dtype=real)
+            return np.moveaxis(X.real, -1, axis), np.moveaxis(X.imag, -1, axis)
+        if method != 'correlation':
+            raise ValueError("Unknown method '{}', use 'correlation', 'fft' or 'auto'".format(method))
 
-        
-        return None, None  
+        # Stacked products run every channel through the same kernel, so each channel gives exactly
+        # the same result as transforming it on its own. The basis holds the cosines followed by the
+        # negated sines, so rex and imx come out of one product.
+        X = (x[..., np.newaxis, :] @ get_dft_basis(N, real))[..., 0, :]
+        rex, imx = X[..., :N // 2 + 1], X[..., N // 2 + 1:]
+        return np.moveaxis(rex, -1, axis), np.moveaxis(imx, -1, axis)
     
     
     def dft_magnitude(self):
         """ 
-        Function that calculates the magnitude of an real and imaginary signal x.
+        Function that calculates the magnitude of an real and imaginary signal x. The magnitude is
+        calculated element by element, so it works for any number of channels.
 
         Parameters: 
         rex (numpy array): Array of numbers representing the real part of the DFT signal.
@@ -57,11 +159,10 @@ class FourierTransform:
         numpy array: Returns magnitude of the real and imaginary signal.
 
         """
-
-        return None
+        return np.sqrt(self.rex ** 2 + self.imx ** 2)
     
     
-    def dft_phase(self, correct_arctan=True, correct_unwrap=True):
+    def dft_phase(self, correct_arctan=True, correct_unwrap=True, axis=None):
         """ 
         Function that calculates the phase of an real and imaginary signal x. 
         Solving the different nuisances that might occur.
@@ -71,13 +172,22 @@ class FourierTransform:
         imx (numpy array): Array of numbers representing the imaginary part of the DFT signal.
         correct_arctan (boolean): If True arctan correction is performed.
         correct_unwrap (boolean): If True phase abiguity correction is performed.
+        axis (int): Frequency axis used for the phase unwrapping. If None, the axis used to
+        compute the DFT is used.
 
         Returns: 
         numpy array: Returns phase of the real and imaginary signal.
 
         """
-        
-        return None
+        if axis is None:
+            axis = self.axis
+        rex = np.where(self.rex == 0, 1e-20, self.rex)
+        phase = np.arctan(self.imx / rex)
+        if correct_arctan:
+            phase = self.arctan_correct(rex, self.imx, phase)
+        if correct_unwrap:
+            phase = self.unwrap(phase, axis)
+        return phase
     
     
     def arctan_correct(self, rex, imx, phase):
@@ -96,25 +206,25 @@ class FourierTransform:
         numpy array: Returns corrected arctan calculation of phase.
 
         """
-
-        
-        return None
+        phase = phase.copy()
+        phase[(rex < 0) & (imx < 0)] -= np.pi
+        phase[(rex < 0) & (imx >= 0)] += np.pi
+        return phase
     
     
-    def unwrap(self, phase):
+    def unwrap(self, phase, axis=0):
         """ 
         Function that ensures that all appropriate multiples of 2𝜋 have been included.
 
         Parameters: 
         phase (numpy array): Array of numbers representing the phase of the DFT signal.
+        axis (int): Frequency axis along which the phase is unwrapped.
 
         Returns: 
         numpy array: Returns unwrapped phase.
 
         """
-
-        
-        return None
+        return np.unwrap(phase, axis=axis)
     
     
     def frequency_domain(self, style='fraction', **kwargs):
@@ -136,4 +246,239 @@ class FourierTransform:
         numpy array: Returns frequency domain's independent variable.
 
             """
-        return None
+        k = np.arange(self.N // 2 + 1)
+        if style == 'samples':
+            domain = k
+        elif style == 'fraction':
+            domain = k / self.N
+        elif style == 'natural':
+            domain = 2 * np.pi * k / self.N
+        elif style == 'analog':
+            domain = k * kwargs['fsamp'] / self.N
+        else:
+            raise ValueError("Unknown style '{}'".format(style))
+
+        shape = [1] * np.ndim(self.signal)
+        shape[self.axis] = -1
+        return domain.reshape(shape)
+
+
+def get_dft_basis(N, dtype=np.float64):
+    """
+    Function that returns the basis functions of the real DFT shared by all callers. Bases are kept in a
+    least recently used cache keyed by (N, dtype) that holds up to DFT_BASIS_CACHE_BYTES, and are read-only;
+    a basis larger than the whole cache is calculated on every call.
+
+    Parameters:
+    N (int): Size of the input signal.
+    dtype (numpy dtype): Type of the basis. It is calculated in double precision and rounded.
+
+    Returns:
+    numpy array: N by 2*(N/2+1) matrix whose first N/2+1 columns are cos(2*pi*k*i/N) and whose last N/2+1
+    columns are -sin(2*pi*k*i/N).
+
+    """
+    key = (int(N), np.dtype(dtype))
+    basis = _basis_cache.get(key)
+    if basis is not None:
+        _basis_cache.move_to_end(key)
+        _basis_cache_stats['hits'] += 1
+        return basis
+
+    _basis_cache_stats['misses'] += 1
+    cos_basis, sin_basis = _dft_basis(int(N))
+    basis = np.concatenate((cos_basis, -sin_basis), axis=1).astype(dtype)
+    basis.setflags(write=False)
+    if basis.nbytes <= DFT_BASIS_CACHE_BYTES:
+        _basis_cache[key] = basis
+        _basis_cache_stats['bytes'] += basis.nbytes
+        while _basis_cache_stats['bytes'] > DFT_BASIS_CACHE_BYTES:
+            _basis_cache_stats['bytes'] -= _basis_cache.popitem(last=False)[1].nbytes
+    return basis
+
+
+def clear_dft_basis_cache():
+    """
+    Function that removes all cached DFT bases and resets the cache counters.
+
+    Returns:
+    None
+
+    """
+    _basis_cache.clear()
+    _basis_cache_stats.update(hits=0, misses=0, bytes=0)
+    return
+
+
+def dft_basis_cache_info():
+    """
+    Function that reports the usage of the DFT basis cache.
+
+    Returns:
+    dict: Number of hits and misses, number of cached bases, memory they take and maximum memory in bytes.
+
+    """
+    return {'hits': _basis_cache_stats['hits'], 'misses': _basis_cache_stats['misses'],
+            'size': len(_basis_cache), 'bytes': _basis_cache_stats['bytes'], 'max_bytes': DFT_BASIS_CACHE_BYTES}
+
+
+def _dft_basis(N):
+    """
+    Function that calculates the cosine and sine basis functions of the real DFT.
+
+    Parameters:
+    N (int): Size of the input signal.
+
+    Returns:
+    cos_basis (numpy array): N by N/2+1 matrix where column k is cos(2*pi*k*i/N).
+    sin_basis (numpy array): N by N/2+1 matrix where column k is sin(2*pi*k*i/N).
+
+    """
+    i = np.arange(N).reshape(-1, 1)
+    k = np.arange(N // 2 + 1)
+    angle = 2 * np.pi * ((i * k) % N) / N
+    return np.cos(angle), np.sin(angle)
+
+
+@profiling.profiled
+def goertzel(x, frequencies, style='samples', axis=0, **kwargs):
+    """
+    Function that calculates selected bins of the DFT of an input signal x with the Goertzel algorithm.
+    Each bin costs O(N) instead of the O(N^2) of the full DFT.
+
+    Parameters:
+    x (numpy array): Array of numbers representing the input signal to be transformed.
+    frequencies (numpy array): Frequencies of the bins to calculate, expressed in the given style.
+    style (string): Style of the frequencies, see FourierTransform.frequency_domain. With 'samples'
+    the frequencies are bin numbers between 0 and N/2.
+    axis (int): Axis of x along which the DFT is computed. Every other axis is treated as an
+    independent channel.
+    fsamp (float): Float value representing the sampling frequency. (Only used for 'analog' style).
+
+    Returns:
+    rex (numpy array): Real DFT part of the selected bins, placed along axis.
+    imx (numpy array): Imaginary DFT part of the selected bins, placed along axis.
+
+    """
+    x = np.moveaxis(np.asarray(x), axis, -1)
+    N = x.shape[-1]
+    w = 2 * np.pi * frequency_to_bin(frequencies, N, style, **kwargs) / N
+
+    X = np.empty(x.shape[:-1] + (w.shape[0],), dtype=complex)
+    for i, wk in enumerate(w):
+        s = scipy.signal.lfilter([1.0], [1.0, -2 * np.cos(wk), 1.0], x, axis=-1)
+        s_prev = s[..., -2] if N > 1 else 0
+        X[..., i] = np.exp(-1j * wk * N) * (np.exp(1j * wk) * s[..., -1] - s_prev)
+    return np.moveaxis(X.real, -1, axis), np.moveaxis(X.imag, -1, axis)
+
+
+def frequency_to_bin(frequencies, N, style='samples', **kwargs):
+    """
+    Function that converts frequencies expressed in a frequency domain style into DFT bin numbers. It is
+    the inverse of FourierTransform.frequency_domain.
+
+    Parameters:
+    frequencies (numpy array): Frequencies to convert.
+    N (int): Size of the DFT.
+    style (string): 'samples', 'fraction', 'natural' or 'analog'.
+    fsamp (float): Float value representing the sampling frequency. (Only used for 'analog' style).
+
+    Returns:
+    numpy array: Returns bin numbers, between 0 and N/2 for frequencies up to the Nyquist frequency.
+
+    """
+    f = np.atleast_1d(np.asarray(frequencies, dtype=float))
+    if style == 'samples':
+        return f
+    elif style == 'fraction':
+        return f * N
+    elif style == 'natural':
+        return f * N / (2 * np.pi)
+    elif style == 'analog':
+        return f * N / kwargs['fsamp']
+    raise ValueError("Unknown style '{}'".format(style))
+
+
+@profiling.profiled_methods
+class SlidingDFT:
+    def __init__(self, N, frequencies, style='samples', resync=None, **kwargs):
+        """
+        Class that tracks selected bins of the DFT of the last N samples of a stream. Every new sample
+        updates each bin in O(1) with the recursion X_k[n] = exp(i*2*pi*k/N) * (X_k[n-1] + x[n] - x[n-N]).
+        To bound the numerical drift of the recursion, the bins are recalculated exactly from the stored
+        window every `resync` samples, which adds O(1) amortized work per sample when resync is N.
+
+        Parameters:
+        N (int): Size of the sliding window.
+        frequencies (numpy array): Frequencies of the bins to track, expressed in the given style. They
+        must fall on integer bin numbers.
+        style (string): Style of the frequencies, see FourierTransform.frequency_domain.
+        resync (int): Number of samples between exact recalculations of the bins. By default N is used.
+        fsamp (float): Float value representing the sampling frequency. (Only used for 'analog' style).
+
+        Attributes:
+        N (int): Size of the sliding window.
+        bins (numpy array): Integer bin numbers being tracked.
+        rex (numpy array): Real DFT part of the tracked bins for the current window.
+        imx (numpy array): Imaginary DFT part of the tracked bins for the current window.
+        """
+        bins = frequency_to_bin(frequencies, N, style, **kwargs)
+        if not np.allclose(bins, np.round(bins)):
+            raise ValueError("Sliding DFT frequencies must fall on integer bins of an N-point DFT")
+        self.N = N
+        self.bins = np.round(bins).astype(int)
+        self.resync = N if resync is None else resync
+        self.w = 2 * np.pi * self.bins / N
+        self.reset()
+        return
+
+    def reset(self):
+        """
+        Function that clears the window, as if N zero samples had been received.
+
+        Returns:
+        None
+
+        """
+        self.window = np.zeros(self.N)
+        self.X = np.zeros(self.bins.shape[0], dtype=complex)
+        self.since_sync = 0
+        self.rex = self.X.real
+        self.imx = self.X.imag
+        return
+
+    def update(self, x):
+        """
+        Function that feeds new samples into the sliding window.
+
+        Parameters:
+        x (numpy array): New sample or chunk of new samples.
+
+        Returns:
+        rex (numpy array): Real DFT part of the tracked bins after each new sample, of shape (m, K)
+        for a chunk of m samples and K tracked bins.
+        imx (numpy array): Imaginary DFT part of the tracked bins after each new sample.
+
+        """
+        x = np.ravel(x).astype(float)
+        m = x.shape[0]
+        if m == 0:
+            return np.zeros((0, self.bins.shape[0])), np.zeros((0, self.bins.shape[0]))
+
+        samples = np.concatenate((self.window, x))
+        delta = x - samples[:m]
+        t = np.arange(1, m + 1).reshape(-1, 1)
+
+        # Unrolled recursion: X[n+t] = exp(i*w*t) * (X[n] + sum_{j<=t} exp(-i*w*(j-1)) * delta[j])
+        X = np.exp(1j * self.w * t) * (self.X + np.cumsum(np.exp(-1j * self.w * (t - 1)) * delta.reshape(-1, 1),
+                                                           axis=0))
+        self.window = samples[m:]
+        self.X = X[-1]
+        self.since_sync += m
+        if self.since_sync >= self.resync:
+            self.X = self.window @ np.exp(-1j * np.outer(np.arange(self.N), self.w))
+            self.since_sync = 0
+
+        self.rex = self.X.real
+        self.imx = self.X.imag
+        return X.real, X.imag
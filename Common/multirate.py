@@ -0,0 +1,148 @@
+import numpy as np
+from Common import fft
+from Common import fir
+
+
+# Default number of kernel taps applied to each output sample, that is, the length of each polyphase branch.
+TAPS_PER_PHASE = 16
+
+
+class PolyphaseResampler():
+    def __init__(self, up, down, h=None, taps_per_phase=TAPS_PER_PHASE, fc=None, window_type='blackman',
+                 dtype=None):
+        """
+        Class that changes the sampling rate of a signal by a rational factor up/down. The result is the same
+        as inserting up-1 zeros between samples, filtering with an anti-alias low pass kernel and keeping one
+        of every down samples, but the kernel is split in up polyphase branches so only the kept output
+        samples are calculated and the inserted zeros are never multiplied. Each output sample costs K/up
+        multiply-adds, about 1/down of filtering the upsampled signal and then decimating.
+        The signal can arrive in chunks of arbitrary size: the last input samples are kept between calls.
+        :param up: (int) interpolation factor L.
+        :param down: (int) decimation factor M. The factors are reduced by their greatest common divisor.
+        :param h: (numpy array) anti-alias kernel at the upsampled rate. If None, it is designed with
+                FIR.low_pass_filter and scaled by up, so the gain of the pass band is 1.
+        :param taps_per_phase: (int) sets the length of the designed kernel, max(up, down)*taps_per_phase
+                samples, so the transition band is the same fraction of the lower Nyquist frequency for any
+                ratio. The polyphase branches have max(1, down/up)*taps_per_phase samples.
+        :param fc: (float) cut-off frequency of the designed kernel at the upsampled rate. By default
+                0.5/max(up, down) is used, the lower of the two Nyquist frequencies.
+        :param window_type: (string) window used to design the kernel. By default 'blackman' is used.
+        :param dtype: (numpy dtype) precision of the resampler. The kernel is converted to it, so float32
+                chunks give float32 outputs. By default the precision of the kernel is used.
+        """
+        if up < 1 or down < 1:
+            raise ValueError("up and down must be positive integers")
+        g = np.gcd(int(up), int(down))
+        self.up = int(up) // g
+        self.down = int(down) // g
+
+        if h is None:
+            fc = 0.5 / max(self.up, self.down) if fc is None else fc
+            h = self.up * fir.FIR().low_pass_filter(fc, max(self.up, self.down) * taps_per_phase, window_type)
+        self.h = fft.to_precision(np.ravel(h), fft.working_dtype(h, dtype=dtype))
+        self.K = self.h.shape[0]
+
+        # Branch p holds h[p], h[p+up], h[p+2*up], ... reversed, so it can be applied to a window of inputs
+        self.T = -(-self.K // self.up)
+        padded = np.zeros(self.up * self.T, dtype=self.h.dtype)
+        padded[:self.K] = self.h
+        self.phases = padded.reshape(self.T, self.up).T[:, ::-1].copy()
+        self.reset()
+        return
+
+    def reset(self):
+        """
+        Function that clears the stored input history, so the next chunk starts a new signal.
+        :return: None
+        """
+        self.history = np.zeros(self.T - 1, dtype=self.h.dtype)
+        self.n_in = 0
+        self.t = 0
+        return
+
+    def process(self, x):
+        """
+        Function that resamples a chunk of the input signal.
+        :param x: (numpy array) chunk of the input signal.
+        :return: (numpy array) output samples whose inputs have all arrived, about len(x)*up/down samples.
+        """
+        x = np.ravel(x)
+        buffer = np.concatenate((self.history, x))
+        self.n_in += x.shape[0]
+        y = self._outputs(buffer, self.n_in * self.up)
+        self.history = buffer[buffer.shape[0] - (self.T - 1):]
+        return y
+
+    def flush(self):
+        """
+        Function that returns the last output samples, produced by the stored history running out of the
+        kernel, and resets the resampler.
+        :return: (numpy array) remaining output samples of the full convolution.
+        """
+        end = self.n_in * self.up + self.K - 1
+        buffer = np.concatenate((self.history, np.zeros(self.T, dtype=self.history.dtype)))
+        self.n_in += self.T
+        y = self._outputs(buffer, min(end, self.n_in * self.up))
+        self.reset()
+        return y
+
+    def resample(self, x):
+        """
+        Function that resamples a whole signal, including the tail of the kernel, and resets the resampler.
+        :param x: (numpy array) input signal.
+        :return: (numpy array) resampled signal of ceil((len(x)*up + K - 1)/down) samples.
+        """
+        self.reset()
+        return np.concatenate((self.process(x), self.flush()))
+
+    def _outputs(self, buffer, stop):
+        """
+        Function that calculates the output samples at the upsampled times self.t, self.t+down, ... below stop.
+        :param buffer: (numpy array) the last T-1 input samples of the previous chunk followed by the new ones,
+                the last sample of the buffer is input number n_in-1.
+        :param stop: (int) first upsampled time that is not calculated.
+        :return: (numpy array) output samples.
+        """
+        times = np.arange(self.t, stop, self.down)
+        self.t += times.shape[0] * self.down
+        if times.shape[0] == 0:
+            return np.zeros(0, dtype=np.result_type(buffer, self.h))
+
+        # Output at upsampled time t uses branch t%up on inputs t//up-T+1 ... t//up. Every up-th output uses
+        # the same branch on inputs that advance by down samples, so each branch is one strided product.
+        first = self.n_in - buffer.shape[0]
+        windows = np.lib.stride_tricks.sliding_window_view(buffer, self.T)
+        y = np.empty(times.shape[0], dtype=np.result_type(buffer, self.h))
+        for r in range(min(self.up, times.shape[0])):
+            start = times[r] // self.up - (self.T - 1) - first
+            count = y[r::self.up].shape[0]
+            rows = windows[start:start + (count - 1) * self.down + 1:self.down]
+            y[r::self.up] = rows @ self.phases[times[r] % self.up]
+        return y
+
+
+def decimate(x, down, taps_per_phase=TAPS_PER_PHASE, window_type='blackman'):
+    """
+    Function that reduces the sampling rate of a signal by an integer factor with a polyphase filter.
+    :param x: (numpy array) input signal.
+    :param down: (int) decimation factor.
+    :param taps_per_phase: (int) the anti-alias kernel has down*taps_per_phase samples.
+    :param window_type: (string) window used to design the kernel. By default 'blackman' is used.
+    :return: (numpy array) decimated signal, in the precision of x.
+    """
+    h = fir.FIR().low_pass_filter(0.5 / down, down * taps_per_phase, window_type)
+    return PolyphaseResampler(1, down, h, dtype=fft.working_dtype(x)).resample(x)
+
+
+def interpolate(x, up, taps_per_phase=TAPS_PER_PHASE, window_type='blackman'):
+    """
+    Function that increases the sampling rate of a signal by an integer factor with a polyphase filter.
+    :param x: (numpy array) input signal.
+    :param up: (int) interpolation factor.
+    :param taps_per_phase: (int) length of each polyphase branch of the interpolation kernel.
+    :param window_type: (string) window used to design the kernel. By default 'blackman' is used.
+    :return: (numpy array) interpolated signal, in the precision of x.
+    """
+    resampler = PolyphaseResampler(up, 1, taps_per_phase=taps_per_phase, window_type=window_type,
+                                   dtype=fft.working_dtype(x))
+    return resampler.resample(x)
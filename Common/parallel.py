@@ -0,0 +1,123 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+from Common import convolution
+from Common import fft
+
+
+# Number of segments given to each worker. More segments than workers balance the load when some
+# segments finish earlier, at the cost of more tasks.
+SEGMENTS_PER_WORKER = 4
+
+
+def parallel_convolve(x, h, workers=None, block_size=None, trim=False):
+    """
+    Function that convolves a long signal, or a set of channels, with a filter kernel using several
+    processes. The overlap-save blocks of each channel are split in contiguous segments that are calculated
+    by a process pool. Every block reads its own M-1 samples of history, so segments need no stitching
+    beyond writing their blocks in place. The input and output are passed to the workers through shared
+    memory, so only the kernel and the segment limits are pickled. Segments start at the batch limits of
+    the serial algorithm, so the result is exactly the same as Convolve.fft_convolve(x, h,
+    method='overlap_save') for every number of workers.
+    :param x: (numpy array) input signal of shape (N,), a column vector, or a set of channels of shape
+            (N, channels), such as Recording.data.
+    :param h: (numpy array) filter kernel of size M, for example the output of FIR.low_pass_filter.
+    :param workers: (int) number of processes. By default one per core is used, and with 1 the
+            convolution runs in the calling process.
+    :param block_size: (int) FFT size of each block. If None, it is selected with fft_block_size.
+    :param trim: (boolean) if True only the first N samples are returned, that is, the output of filtering
+            x with the FIR filter h, the same as StreamingFIR. Otherwise the full convolution of N+M-1
+            samples is returned.
+    :return: (numpy array) convolved signal, with the same number of dimensions as x.
+    """
+    x = np.asarray(x)
+    shape = x.shape
+    real = fft.working_dtype(x, h)
+    x = fft.to_precision(x.reshape(shape[0], -1), real)
+    h = fft.to_precision(np.ravel(h), real)
+    N, channels = x.shape
+    M = h.shape[0]
+    workers = os.cpu_count() if workers is None else workers
+
+    nfft = convolution.fft_block_size(M, N) if block_size is None else block_size
+    if nfft < 2 * M - 1:
+        raise ValueError("block_size must be at least 2*M-1={}".format(2 * M - 1))
+    L = nfft - M + 1
+    n_out = N + M - 1
+    n_blocks = -(-n_out // L)
+    batch = max(1, convolution.FFT_BATCH_SAMPLES // nfft)
+
+    # Segments are whole batches of blocks, about SEGMENTS_PER_WORKER per worker over all channels
+    per_segment = -(-n_blocks * channels // (workers * SEGMENTS_PER_WORKER))
+    per_segment = max(1, -(-per_segment // batch)) * batch
+    tasks = [(c, start, min(start + per_segment, n_blocks))
+             for c in range(channels) for start in range(0, n_blocks, per_segment)]
+
+    in_dtype = x.dtype
+    out_dtype = np.result_type(x, h)
+    in_shape = (channels, n_blocks * L + M - 1)
+    out_shape = (channels, n_blocks * L)
+    shm_in = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(in_shape)) * in_dtype.itemsize))
+    shm_out = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(out_shape)) * out_dtype.itemsize))
+    try:
+        x_pad = np.ndarray(in_shape, dtype=in_dtype, buffer=shm_in.buf)
+        x_pad[:, :M - 1] = 0
+        x_pad[:, M - 1:M - 1 + N] = x.T
+        x_pad[:, M - 1 + N:] = 0
+        del x_pad
+
+        args = (shm_in.name, in_shape, in_dtype, shm_out.name, out_shape, out_dtype, h, nfft)
+        if workers == 1 or len(tasks) == 1:
+            for task in tasks:
+                _convolve_segment(*(args + task))
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+                futures = [pool.submit(_convolve_segment, *(args + task)) for task in tasks]
+                for future in futures:
+                    future.result()
+
+        y = np.ndarray(out_shape, dtype=out_dtype, buffer=shm_out.buf)
+        y = y[:, :N if trim else n_out].T.copy()
+    finally:
+        shm_in.close()
+        shm_in.unlink()
+        shm_out.close()
+        shm_out.unlink()
+
+    if len(shape) == 1:
+        return y[:, 0]
+    return y.reshape((y.shape[0],) + shape[1:])
+
+
+def _convolve_segment(in_name, in_shape, in_dtype, out_name, out_shape, out_dtype, h, nfft, channel, start, stop):
+    """
+    Function run by the workers that calculates the overlap-save blocks start to stop-1 of one channel,
+    reading the padded input from shared memory and writing the blocks to the shared output.
+    :param in_name: (string) name of the shared memory with the padded input, of shape in_shape.
+    :param in_shape: (tuple) shape of the padded input, (channels, padded length).
+    :param in_dtype: (numpy dtype) type of the input.
+    :param out_name: (string) name of the shared memory of the output, of shape out_shape.
+    :param out_shape: (tuple) shape of the output, (channels, number of blocks * L).
+    :param out_dtype: (numpy dtype) type of the output.
+    :param h: (numpy array) filter kernel.
+    :param nfft: (int) FFT size of each block.
+    :param channel: (int) channel to convolve.
+    :param start: (int) first block of the segment.
+    :param stop: (int) last block of the segment, not included.
+    :return: None
+    """
+    shm_in = shared_memory.SharedMemory(name=in_name)
+    shm_out = shared_memory.SharedMemory(name=out_name)
+    try:
+        x_pad = np.ndarray(in_shape, dtype=in_dtype, buffer=shm_in.buf)[channel]
+        y = np.ndarray(out_shape, dtype=out_dtype, buffer=shm_out.buf)[channel]
+        forward, inverse = convolution._block_transforms(x_pad, h)
+        H = forward(h, nfft)
+        convolution._overlap_save_blocks(x_pad, H, h.shape[0], nfft, start, stop, y, forward, inverse)
+        del x_pad, y
+    finally:
+        shm_in.close()
+        shm_out.close()
+    return
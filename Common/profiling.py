@@ -0,0 +1,208 @@
+import functools
+import json
+import time
+import tracemalloc
+
+import numpy as np
+
+
+# Maximum number of latencies kept per function to calculate percentiles. Once reached, latencies are
+# kept by reservoir sampling, so memory stays bounded for long profiling sessions.
+LATENCY_SAMPLES = 10000
+
+# Active profiles. Instrumented functions check this list first, so when no profile is active the only
+# overhead is one extra function call and one test.
+_active = []
+
+# Peak memory of the calls in progress, used when memory is measured with tracemalloc.
+_peaks = []
+
+
+class Profile():
+    def __init__(self, memory=False):
+        """
+        Class that collects the metrics of the instrumented functions while it is active, see profile().
+        :param memory: (boolean) if True the peak memory allocated by each call is measured with
+                tracemalloc, which slows down every allocation while the profile is active.
+
+        Attributes:
+        stats (dict): metrics of each function, keyed by its qualified name such as 'FFT.fft'.
+        """
+        self.memory = memory
+        self.stats = {}
+        self._rng = np.random.default_rng(0)
+        return
+
+    def record(self, name, seconds, samples, nbytes, peak):
+        """
+        Function that adds one call to the metrics of a function.
+        :param name: (string) qualified name of the function.
+        :param seconds: (float) duration of the call.
+        :param samples: (int) number of elements of the array arguments.
+        :param nbytes: (int) bytes of the array arguments.
+        :param peak: (int) peak memory allocated by the call, or None if memory is not measured.
+        :return: None
+        """
+        s = self.stats.get(name)
+        if s is None:
+            s = self.stats[name] = {'calls': 0, 'seconds': 0.0, 'latencies': [], 'input_samples': 0,
+                                    'max_input_samples': 0, 'input_bytes': 0, 'allocated_bytes': 0,
+                                    'max_allocated_bytes': 0}
+        s['calls'] += 1
+        s['seconds'] += seconds
+        if len(s['latencies']) < LATENCY_SAMPLES:
+            s['latencies'].append(seconds)
+        else:
+            k = self._rng.integers(s['calls'])
+            if k < LATENCY_SAMPLES:
+                s['latencies'][k] = seconds
+        s['input_samples'] += samples
+        s['max_input_samples'] = max(s['max_input_samples'], samples)
+        s['input_bytes'] += nbytes
+        if peak is not None:
+            s['allocated_bytes'] += peak
+            s['max_allocated_bytes'] = max(s['max_allocated_bytes'], peak)
+        return
+
+    def as_dict(self):
+        """
+        Function that summarizes the metrics of every function. Times include the time of the instrumented
+        functions called inside, for example FFT.fft includes FFT.rfft.
+        :return: (dict) for each function the number of calls, cumulative time, mean and 50th, 90th and
+                 99th percentile latencies in seconds, total and largest input size in samples, input bytes
+                 and, when memory is measured, total and largest peak memory allocated by a call.
+        """
+        summary = {}
+        for name, s in sorted(self.stats.items(), key=lambda item: -item[1]['seconds']):
+            p50, p90, p99 = np.percentile(s['latencies'], (50, 90, 99))
+            entry = {'calls': s['calls'], 'seconds': s['seconds'], 'mean': s['seconds'] / s['calls'],
+                     'p50': float(p50), 'p90': float(p90), 'p99': float(p99),
+                     'input_samples': s['input_samples'], 'max_input_samples': s['max_input_samples'],
+                     'input_bytes': s['input_bytes']}
+            if self.memory:
+                entry['allocated_bytes'] = s['allocated_bytes']
+                entry['max_allocated_bytes'] = s['max_allocated_bytes']
+            summary[name] = entry
+        return summary
+
+    def to_json(self, path=None):
+        """
+        Function that exports the summary of the metrics as JSON.
+        :param path: (string) if given, the JSON is written to this file.
+        :return: (string) JSON text.
+        """
+        text = json.dumps(self.as_dict(), indent=1)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(text)
+        return text
+
+    def report(self):
+        """
+        Function that formats the summary of the metrics as a table, slowest functions first.
+        :return: (string) table.
+        """
+        lines = ['{:<40} {:>8} {:>11} {:>10} {:>10} {:>10}'.format('function', 'calls', 'total ms', 'p50 ms',
+                                                                  'p99 ms', 'max size')]
+        for name, s in self.as_dict().items():
+            lines.append('{:<40} {:>8} {:>11.3f} {:>10.3f} {:>10.3f} {:>10}'.format(
+                name, s['calls'], s['seconds'] * 1e3, s['p50'] * 1e3, s['p99'] * 1e3, s['max_input_samples']))
+        return '\n'.join(lines)
+
+    def __enter__(self):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        else:
+            self._started_tracing = False
+        _active.append(self)
+        return self
+
+    def __exit__(self, *exc):
+        _active.remove(self)
+        if self._started_tracing:
+            tracemalloc.stop()
+        return False
+
+
+def profile(memory=False):
+    """
+    Function that creates a profile to be used as a context manager. The instrumented functions of Common
+    record their metrics while the context is active:
+        with profiling.profile() as p:
+            FFT().fft(x)
+        print(p.report())
+    Profiles can be nested, every active profile records the calls. Profiles are not thread safe.
+    :param memory: (boolean) if True the peak memory allocated by each call is also measured.
+    :return: (Profile) profile to use in a with statement.
+    """
+    return Profile(memory)
+
+
+def profiled(function):
+    """
+    Decorator that instruments a function or method. When no profile is active the function is called
+    directly, so instrumented code can stay in place at almost no cost.
+    :param function: (function) function to instrument.
+    :return: (function) instrumented function.
+    """
+    name = function.__qualname__
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not _active:
+            return function(*args, **kwargs)
+        return _call(name, function, args, kwargs)
+    return wrapper
+
+
+def profiled_methods(cls):
+    """
+    Class decorator that instruments all the public methods defined by a class.
+    :param cls: (class) class to instrument.
+    :return: (class) the same class.
+    """
+    for name, member in list(vars(cls).items()):
+        if not name.startswith('_') and callable(member):
+            setattr(cls, name, profiled(member))
+    return cls
+
+
+def _call(name, function, args, kwargs):
+    """
+    Function that calls an instrumented function and records its metrics in the active profiles.
+    :param name: (string) qualified name of the function.
+    :param function: (function) function to call.
+    :param args: (tuple) positional arguments.
+    :param kwargs: (dict) keyword arguments.
+    :return: value returned by the function.
+    """
+    samples = 0
+    nbytes = 0
+    for a in list(args) + list(kwargs.values()):
+        if isinstance(a, np.ndarray):
+            samples += a.size
+            nbytes += a.nbytes
+
+    memory = tracemalloc.is_tracing() and any(p.memory for p in _active)
+    if memory:
+        # tracemalloc has a single peak: the peak reached so far is saved for the calling function before
+        # it is reset for this call
+        start = tracemalloc.get_traced_memory()[0]
+        if _peaks:
+            _peaks[-1] = max(_peaks[-1], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        _peaks.append(0)
+
+    t0 = time.perf_counter()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        seconds = time.perf_counter() - t0
+        peak = None
+        if memory:
+            peak = max(_peaks.pop(), tracemalloc.get_traced_memory()[1]) - start
+            if _peaks:
+                _peaks[-1] = max(_peaks[-1], peak + start)
+        for p in list(_active):
+            p.record(name, seconds, samples, nbytes, peak if p.memory else None)
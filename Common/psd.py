@@ -0,0 +1,196 @@
+import numpy as np
+from Common import fft
+from Common import windows
+
+
+# Maximum number of samples windowed and transformed at once. Longer inputs are processed in batches of
+# segments so that the temporary copies stay bounded and small enough to remain in cache.
+SEGMENT_BATCH_SAMPLES = 2 ** 15
+
+
+class Welch():
+    def __init__(self, nperseg, noverlap=None, fs=1.0, window_type='hamming', nfft=None, detrend='constant',
+                 average='mean', axis=0, beta=None):
+        """
+        Class that estimates the power spectral density of a signal with Welch's method. The signal is split
+        in overlapping segments, each segment is windowed and its periodogram is calculated with the FFT,
+        and the periodograms are averaged. Segments are taken as strided views of the input and transformed
+        in batches, and the input can be fed in chunks with update(), so signals larger than memory can be
+        processed. The scaling is the same as scipy.signal.welch with scaling='density'. Segments are
+        transformed in the precision of the signal, and periodograms are accumulated in double precision.
+        :param nperseg: (int) length of each segment.
+        :param noverlap: (int) number of samples shared by consecutive segments. By default nperseg/2 is used.
+                Bartlett's method is obtained with noverlap=0 and window_type='rectangular'.
+        :param fs: (float) sampling frequency of the signal. By default 1.0 is used.
+        :param window_type: (string) window to use from the window registry, 'hamming', 'blackman', 'hann',
+                'flattop', 'kaiser' or 'rectangular'. By default 'hamming' is used.
+        :param nfft: (int) size of the FFT of each segment. By default nperseg is used.
+        :param detrend: (string) 'constant' to remove the mean of each segment or False to keep it.
+        :param average: (string) 'mean' or 'median' of the periodograms. The median keeps every periodogram
+                until psd() is called, so its memory grows with the number of segments.
+        :param axis: (int) axis of the signal along which the PSD is computed. Every other axis is treated as
+                an independent channel. By default axis 0 is used.
+        :param beta: (float) shape parameter of the Kaiser window.
+        """
+        self.nperseg = nperseg
+        self.noverlap = nperseg // 2 if noverlap is None else noverlap
+        self.step = nperseg - self.noverlap
+        self.fs = fs
+        self.nfft = nperseg if nfft is None else nfft
+        self.detrend = detrend
+        self.average = average
+        self.axis = axis
+        if not 0 <= self.noverlap < nperseg:
+            raise ValueError("noverlap must be between 0 and nperseg-1")
+        if average not in ('mean', 'median'):
+            raise ValueError("Unknown average '{}', use 'mean' or 'median'".format(average))
+        if detrend not in ('constant', False):
+            raise ValueError("Unknown detrend '{}', use 'constant' or False".format(detrend))
+
+        self.window = windows.get_window(window_type, nperseg, beta=beta)
+
+        self.scale = float(1.0 / (fs * np.sum(self.window ** 2)))
+        self.fft = fft.FFT()
+        self.reset()
+        return
+
+    def reset(self):
+        """
+        Function that discards all the segments accumulated so far.
+        :return: None
+        """
+        self.buffer = None
+        self.total = None
+        self.periodograms = []
+        self.nsegments = 0
+        self.dtype = np.float64
+        return
+
+    def update(self, x):
+        """
+        Function that feeds a chunk of the signal. Complete segments are transformed and accumulated, and the
+        samples of an incomplete segment are kept for the next chunk.
+        :param x: (numpy array) chunk of the input signal.
+        :return: None
+        """
+        x = np.asarray(x)
+        x = np.moveaxis(x.astype(fft.working_dtype(x), copy=False), self.axis, -1)
+        if self.buffer is not None:
+            x = np.concatenate((self.buffer, x), axis=-1)
+
+        nsegments = 0 if x.shape[-1] < self.nperseg else (x.shape[-1] - self.nperseg) // self.step + 1
+        batch = max(1, SEGMENT_BATCH_SAMPLES // (self.nfft * max(1, x[..., 0].size)))
+        for k in range(0, nsegments, batch):
+            start = k * self.step
+            stop = (min(k + batch, nsegments) - 1) * self.step + self.nperseg
+            segments = np.lib.stride_tricks.sliding_window_view(x[..., start:stop], self.nperseg,
+                                                                axis=-1)[..., ::self.step, :]
+            self._accumulate(segments)
+
+        self.buffer = x[..., nsegments * self.step:].copy()
+        return
+
+    def psd(self):
+        """
+        Function that calculates the power spectral density from the segments accumulated so far.
+        :return: freq (numpy array) frequencies between 0 and fs/2.
+                 psd (numpy array) power spectral density, with frequency along the selected axis.
+        """
+        if self.nsegments == 0:
+            raise ValueError("At least one complete segment of nperseg samples is needed")
+        if self.average == 'mean':
+            psd = (self.total / self.nsegments).astype(self.dtype)
+        else:
+            psd = np.median(np.concatenate(self.periodograms, axis=-2), axis=-2) / float(_median_bias(self.nsegments))
+
+        freq = np.arange(self.nfft // 2 + 1) * self.fs / self.nfft
+        return freq, np.moveaxis(psd, -1, self.axis)
+
+    def estimate(self, x):
+        """
+        Function that calculates the power spectral density of a whole signal.
+        :param x: (numpy array) input signal.
+        :return: freq (numpy array) frequencies between 0 and fs/2.
+                 psd (numpy array) power spectral density, with frequency along the selected axis.
+        """
+        self.reset()
+        self.update(x)
+        result = self.psd()
+        self.reset()
+        return result
+
+    def _accumulate(self, segments):
+        """
+        Function that windows and transforms a batch of segments and accumulates their periodograms.
+        :param segments: (numpy array) segments of shape (..., number of segments, nperseg).
+        :return: None
+        """
+        window = self.window.astype(segments.dtype, copy=False)
+        windowed = np.zeros(segments.shape[:-1] + (self.nfft,), dtype=segments.dtype)
+        if self.detrend == 'constant':
+            windowed[..., :self.nperseg] = (segments - segments.mean(axis=-1, keepdims=True)) * window
+        else:
+            windowed[..., :self.nperseg] = segments * window
+
+        X = self.fft.fft(windowed, axis=-1)
+        periodograms = (X.real ** 2 + X.imag ** 2) * self.scale
+        # One sided spectrum: every bin but DC and Nyquist also holds the power of its negative frequency
+        if self.nfft % 2 == 0:
+            periodograms[..., 1:-1] *= 2
+        else:
+            periodograms[..., 1:] *= 2
+
+        if self.average == 'mean':
+            self.dtype = periodograms.dtype
+            total = periodograms.sum(axis=-2, dtype=np.float64)
+            self.total = total if self.total is None else self.total + total
+        else:
+            self.periodograms.append(periodograms)
+        self.nsegments += segments.shape[-2]
+        return
+
+
+def welch(x, nperseg, noverlap=None, fs=1.0, window_type='hamming', nfft=None, detrend='constant',
+          average='mean', axis=0, beta=None):
+    """
+    Function that estimates the power spectral density of a signal using Welch's method.
+    :param x: (numpy array) input signal.
+    :param nperseg: (int) length of each segment.
+    :param noverlap: (int) number of samples shared by consecutive segments. By default nperseg/2 is used.
+    :param fs: (float) sampling frequency of the signal. By default 1.0 is used.
+    :param window_type: (string) window from the window registry, see Welch. By default 'hamming' is used.
+    :param nfft: (int) size of the FFT of each segment. By default nperseg is used.
+    :param detrend: (string) 'constant' to remove the mean of each segment or False to keep it.
+    :param average: (string) 'mean' or 'median' of the periodograms.
+    :param axis: (int) axis of the signal along which the PSD is computed. By default axis 0 is used.
+    :param beta: (float) shape parameter of the Kaiser window.
+    :return: freq (numpy array) frequencies between 0 and fs/2.
+             psd (numpy array) power spectral density.
+    """
+    estimator = Welch(nperseg, noverlap, fs, window_type, nfft, detrend, average, axis, beta)
+    return estimator.estimate(x)
+
+
+def bartlett_periodogram(x, nperseg, fs=1.0, average='mean', axis=0):
+    """
+    Function that estimates the power spectral density of a signal using Bartlett's method, that is, the
+    average of the periodograms of non-overlapping segments without windowing.
+    :param x: (numpy array) input signal.
+    :param nperseg: (int) length of each segment.
+    :param fs: (float) sampling frequency of the signal. By default 1.0 is used.
+    :param average: (string) 'mean' or 'median' of the periodograms.
+    :param axis: (int) axis of the signal along which the PSD is computed. By default axis 0 is used.
+    :return: freq (numpy array) frequencies between 0 and fs/2.
+             psd (numpy array) power spectral density.
+    """
+    return welch(x, nperseg, 0, fs, 'rectangular', None, 'constant', average, axis)
+
+
+def _median_bias(n):
+    """
+    Function that calculates the bias of the median of n periodograms with respect to their mean.
+    :param n: (int) number of periodograms.
+    :return: (float) bias factor.
+    """
+    ii_2 = 2 * np.arange(1., (n - 1) // 2 + 1)
+    return 1 + np.sum(1. / (ii_2 + 1) - 1. / ii_2)
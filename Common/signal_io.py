@@ -0,0 +1,222 @@
+import itertools
+import mmap
+import struct
+
+import numpy as np
+
+
+# Header of the binary signal format: magic, dtype string, number of channels, number of samples and
+# sample rate. The samples start HEADER_SIZE bytes into the file, stored channel after channel.
+MAGIC = b'DSPSIG01'
+HEADER = struct.Struct('<8s8sIQd')
+HEADER_SIZE = 64
+
+# Number of text rows parsed at once when converting text files.
+CONVERT_CHUNK_ROWS = 2 ** 16
+
+
+class Recording():
+    def __init__(self, path, mode='r'):
+        """
+        Class that memory-maps a signal stored in the binary format written by write_signal and
+        convert_text. Only the header is read when the file is opened, so opening takes the same time for
+        any file size, and samples are read from disk by the operating system when they are accessed.
+        :param path: (string) path of the binary file.
+        :param mode: (string) 'r' to open the file read-only or 'r+' to allow modifying the samples.
+
+        Attributes:
+        fs (float): sampling frequency of the signal.
+        dtype (numpy dtype): type of the samples.
+        channels (int): number of channels.
+        samples (int): number of samples of each channel.
+        data (numpy array): zero-copy view of the samples, of shape (samples, channels). Each channel is
+                contiguous on disk, so data[:, k] is a contiguous view.
+        """
+        if mode not in ('r', 'r+'):
+            raise ValueError("Unknown mode '{}', use 'r' or 'r+'".format(mode))
+        self.path = path
+        self.fs, self.dtype, self.channels, self.samples = read_header(path)
+        self._map = None
+        if self.samples * self.channels == 0:
+            self.data = np.zeros((self.samples, self.channels), dtype=self.dtype)
+        else:
+            data = np.memmap(path, dtype=self.dtype, mode=mode, offset=HEADER_SIZE,
+                             shape=(self.channels, self.samples))
+            self._map = getattr(data, '_mmap', None)
+            self.data = data.T
+        return
+
+    def __len__(self):
+        return self.samples
+
+    def channel(self, k):
+        """
+        Function that returns one channel of the signal.
+        :param k: (int) channel number.
+        :return: (numpy array) zero-copy 1-D view of the channel.
+        """
+        return self.data[:, k]
+
+    def chunks(self, size, channel=None, overlap=0, release=True):
+        """
+        Generator that iterates the signal in chunks of a fixed number of samples, which can be fed to
+        Convolve, FFT or the streaming classes. Chunks are views of the memory map, so only the samples of
+        the chunks in use are resident in memory.
+        :param size: (int) number of samples of each chunk. The last chunk can be shorter.
+        :param channel: (int) if given, chunks are 1-D views of this channel, otherwise they have shape
+                (size, channels).
+        :param overlap: (int) number of samples shared by consecutive chunks, for example M-1 to filter each
+                chunk independently with a kernel of size M. By default chunks do not overlap.
+        :param release: (boolean) if True, the pages of a chunk are dropped from memory when the next chunk
+                is requested, so resident memory stays proportional to the chunk size even for a single
+                pass over a file larger than memory. A chunk that is kept is read again from the file.
+        :return: (generator) chunks of the signal.
+        """
+        if not 0 <= overlap < size:
+            raise ValueError("overlap must be between 0 and size-1")
+        data = self.data if channel is None else self.channel(channel)
+        channels = range(self.channels) if channel is None else [channel]
+        start = 0
+        while start < self.samples:
+            yield data[start:start + size]
+            if start + size >= self.samples:
+                break
+            if release:
+                for k in channels:
+                    self._release(k, start, start + size - overlap)
+            start += size - overlap
+
+    def _release(self, k, start, stop):
+        """
+        Function that drops from memory the pages of the samples start to stop-1 of channel k. Only whole
+        pages are dropped, and nothing is done on platforms without madvise.
+        :param k: (int) channel number.
+        :param start: (int) first sample.
+        :param stop: (int) last sample, not included.
+        :return: None
+        """
+        if self._map is None or not hasattr(mmap, 'MADV_DONTNEED'):
+            return
+        first = HEADER_SIZE + (k * self.samples + start) * self.dtype.itemsize
+        last = HEADER_SIZE + (k * self.samples + stop) * self.dtype.itemsize
+        first = -(-first // mmap.PAGESIZE) * mmap.PAGESIZE
+        last = last // mmap.PAGESIZE * mmap.PAGESIZE
+        if last > first:
+            self._map.madvise(mmap.MADV_DONTNEED, first, last - first)
+        return
+
+
+def read_header(path):
+    """
+    Function that reads the header of a binary signal file.
+    :param path: (string) path of the binary file.
+    :return: fs (float) sampling frequency.
+             dtype (numpy dtype) type of the samples.
+             channels (int) number of channels.
+             samples (int) number of samples of each channel.
+    """
+    with open(path, 'rb') as f:
+        header = f.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE or header[:len(MAGIC)] != MAGIC:
+        raise ValueError("'{}' is not a binary signal file".format(path))
+    _, dtype, channels, samples, fs = HEADER.unpack(header[:HEADER.size])
+    return fs, np.dtype(dtype.rstrip(b'\0').decode()), channels, samples
+
+
+def open_signal(path, mode='r'):
+    """
+    Function that memory-maps a binary signal file.
+    :param path: (string) path of the binary file.
+    :param mode: (string) 'r' to open the file read-only or 'r+' to allow modifying the samples.
+    :return: (Recording) memory-mapped signal.
+    """
+    return Recording(path, mode)
+
+
+def write_signal(path, x, fs=1.0, dtype=None):
+    """
+    Function that writes a signal in the binary format read by open_signal.
+    :param path: (string) path of the binary file.
+    :param x: (numpy array) signal of shape (samples,) or (samples, channels).
+    :param fs: (float) sampling frequency of the signal. By default 1.0 is used.
+    :param dtype: (numpy dtype) type of the stored samples. By default the type of x is used.
+    :return: (Recording) the written signal, memory-mapped read-only.
+    """
+    x = np.asarray(x)
+    if x.ndim == 1:
+        x = x.reshape(-1, 1)
+    data = _create(path, x.shape[0], x.shape[1], fs, x.dtype if dtype is None else dtype)
+    if data is not None:
+        data[:] = x.T
+        data.flush()
+        del data
+    return Recording(path)
+
+
+def convert_text(source, path, fs=1.0, dtype=np.float32, delimiter=None, skiprows=0, usecols=None,
+                 comments='#', chunk_rows=CONVERT_CHUNK_ROWS):
+    """
+    Function that converts a text or CSV signal, with one sample per row and one channel per column, to
+    the binary format read by open_signal. The text is parsed chunk_rows rows at a time and written
+    straight to disk, so memory does not depend on the size of the file. For example, the waveforms of the
+    moving average notebook are converted with convert_text('waveforms.dat', 'waveforms.sig') and the sonar
+    dataset of Project 2 with delimiter=',', skiprows=1 and usecols=range(60).
+    :param source: (string) path of the text file.
+    :param path: (string) path of the binary file.
+    :param fs: (float) sampling frequency of the signal. By default 1.0 is used.
+    :param dtype: (numpy dtype) type of the stored samples. By default float32 is used.
+    :param delimiter: (string) column separator, see np.loadtxt. By default any whitespace is used.
+    :param skiprows: (int) number of rows skipped at the start of the file, such as a CSV header.
+    :param usecols: (sequence) columns to keep. By default all columns are kept.
+    :param comments: (string) rows starting with this string are skipped.
+    :param chunk_rows: (int) number of rows parsed at once.
+    :return: (Recording) the converted signal, memory-mapped read-only.
+    """
+    def rows(f):
+        for line in itertools.islice(f, skiprows, None):
+            stripped = line.strip()
+            if stripped and not (comments and stripped.startswith(comments)):
+                yield line
+
+    # A first pass counts the rows, so the file can be allocated before the samples are parsed
+    with open(source) as f:
+        samples = sum(1 for _ in rows(f))
+        f.seek(0)
+        first = list(itertools.islice(rows(f), 1))
+    channels = 0
+    if first:
+        channels = np.loadtxt(first, dtype=dtype, delimiter=delimiter, usecols=usecols, ndmin=2).shape[1]
+
+    data = _create(path, samples, channels, fs, dtype)
+    if data is not None:
+        with open(source) as f:
+            lines = rows(f)
+            start = 0
+            while start < samples:
+                chunk = list(itertools.islice(lines, chunk_rows))
+                block = np.loadtxt(chunk, dtype=dtype, delimiter=delimiter, usecols=usecols, ndmin=2)
+                data[:, start:start + block.shape[0]] = block.T
+                start += block.shape[0]
+        data.flush()
+        del data
+    return Recording(path)
+
+
+def _create(path, samples, channels, fs, dtype):
+    """
+    Function that writes the header of a binary signal file and allocates its samples.
+    :param path: (string) path of the binary file.
+    :param samples: (int) number of samples of each channel.
+    :param channels: (int) number of channels.
+    :param fs: (float) sampling frequency.
+    :param dtype: (numpy dtype) type of the samples.
+    :return: (numpy memmap) writable map of shape (channels, samples), or None for an empty signal.
+    """
+    dtype = np.dtype(dtype)
+    header = HEADER.pack(MAGIC, dtype.str.encode(), channels, samples, fs)
+    with open(path, 'wb') as f:
+        f.write(header.ljust(HEADER_SIZE, b'\0'))
+        f.truncate(HEADER_SIZE + samples * channels * dtype.itemsize)
+    if samples * channels == 0:
+        return None
+    return np.memmap(path, dtype=dtype, mode='r+', offset=HEADER_SIZE, shape=(channels, samples))
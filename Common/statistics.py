@@ -1,6 +1,181 @@
 import numpy as np
+from Common import profiling
 
+
+@profiling.profiled_methods
 class Running_Statistics():
-    
-    def __init__(self):
+
+    def __init__(self, bins=None, limits=None):
+        """
+        Class that calculates the statistics of a signal that arrives in chunks, without keeping the samples.
+        Chunks are added with Welford's update, extended to whole chunks: the mean and sum of squared
+        deviations of each chunk are calculated in one vectorized pass and combined with the accumulated
+        ones, which avoids the round-off error of the sum of squares formula when the mean is much larger
+        than the standard deviation. Two accumulators of different parts of a signal can be merged, so
+        statistics of several files or workers can be calculated in parallel and combined.
+        :param bins: (int) if given, a histogram of this number of bins is also accumulated.
+        :param limits: (tuple) lower and upper limits of the histogram, required with bins. Samples outside
+                the limits are counted in below and above.
+
+        Attributes:
+        n (int): number of samples of each channel.
+        mean (numpy array): mean of each channel.
+        var (numpy array): variance of each channel, with the N-1 denominator.
+        std (numpy array): standard deviation of each channel.
+        min (numpy array): minimum of each channel.
+        max (numpy array): maximum of each channel.
+        hist (numpy array): histogram of shape (bins, ...), with one column for each channel.
+        edges (numpy array): bins+1 edges of the histogram bins.
+        below (numpy array): number of samples of each channel lower than the histogram limits.
+        above (numpy array): number of samples of each channel higher than the histogram limits.
+        The statistics have the shape of a chunk without its first axis, so they are scalars for 1-D chunks.
+        """
+        if bins is not None and limits is None:
+            raise ValueError("A histogram needs the limits of its bins")
+        self.bins = bins
+        self.limits = None if limits is None else (float(limits[0]), float(limits[1]))
+        self.edges = None if bins is None else np.linspace(self.limits[0], self.limits[1], bins + 1)
+        self.n = 0
+        self.m2 = None
+        self.mean = self.var = self.std = self.min = self.max = None
+        self.hist = self.below = self.above = None
+        return
+
+    def update(self, x):
+        """
+        Function that adds a chunk of samples to the statistics.
+        :param x: (numpy array) chunk of shape (n,) for a single channel or (n, channels). A scalar is a
+                single sample.
+        :return: None
+        """
+        x = np.asarray(x, dtype=np.float64)
+        if x.ndim == 0:
+            x = x.reshape(1)
+        if x.shape[0] == 0:
+            return
+
+        # Two-pass statistics of the chunk, combined with the accumulated ones by _combine. The samples are
+        # shifted by the first one, so a large offset does not reduce the precision of the sums.
+        shifted = x - x[0]
+        mean = np.mean(shifted, axis=0)
+        m2 = np.sum((shifted - mean) ** 2, axis=0)
+        mean = mean + x[0]
+        hist = below = above = None
+        if self.bins is not None:
+            hist, below, above = self._histogram(x)
+        self._combine(x.shape[0], mean, m2, np.min(x, axis=0), np.max(x, axis=0), hist, below, above)
+        return
+
+    def merge(self, other):
+        """
+        Function that adds the statistics of another accumulator, as if all its chunks had been added to
+        this one.
+        :param other: (Running_Statistics) accumulator of the same channels and histogram bins.
+        :return: (Running_Statistics) this accumulator, updated.
+        """
+        if self.bins != other.bins or self.limits != other.limits:
+            raise ValueError("Only accumulators with the same histogram bins can be merged")
+        if other.n:
+            self._combine(other.n, other.mean, other.m2, other.min, other.max, other.hist, other.below,
+                          other.above)
+        return self
+
+    def calc(self):
+        """
+        Function that returns the mean, variance and standard deviation of the samples added so far.
+        :return: mean (numpy array) mean of each channel.
+                 var (numpy array) variance of each channel.
+                 std (numpy array) standard deviation of each channel.
+        """
+        return self.mean, self.var, self.std
+
+    def run(self, x):
+        """
+        Function that adds a chunk of samples and returns the updated mean, variance and standard deviation.
+        :param x: (numpy array) chunk of samples, see update.
+        :return: mean (numpy array) mean of each channel.
+                 var (numpy array) variance of each channel.
+                 std (numpy array) standard deviation of each channel.
+        """
+        self.update(x)
+        return self.calc()
+
+    def rms(self):
+        """
+        Function that calculates the root mean square of each channel.
+        :return: (numpy array) RMS of each channel.
+        """
+        return np.sqrt(self.mean ** 2 + self.m2 / self.n)
+
+    def snr(self):
+        """
+        Function that calculates the signal to noise ratio of each channel, the mean divided by the standard
+        deviation.
+        :return: (numpy array) SNR of each channel.
+        """
+        return self.mean / self.std
+
+    def cv(self):
+        """
+        Function that calculates the coefficient of variation of each channel, the standard deviation as a
+        percentage of the mean.
+        :return: (numpy array) CV of each channel.
+        """
+        return 100 * self.std / self.mean
+
+    def _combine(self, n, mean, m2, x_min, x_max, hist, below, above):
+        """
+        Function that combines the accumulated statistics with the statistics of another set of samples.
+        :param n: (int) number of samples of the other set.
+        :param mean: (numpy array) mean of the other set.
+        :param m2: (numpy array) sum of squared deviations from the mean of the other set.
+        :param x_min: (numpy array) minimum of the other set.
+        :param x_max: (numpy array) maximum of the other set.
+        :param hist: (numpy array) histogram of the other set, or None without histogram.
+        :param below: (numpy array) samples of the other set lower than the histogram limits.
+        :param above: (numpy array) samples of the other set higher than the histogram limits.
+        :return: None
+        """
+        if self.n == 0:
+            self.mean, self.m2, self.min, self.max = np.copy(mean), np.copy(m2), np.copy(x_min), np.copy(x_max)
+            if hist is not None:
+                self.hist, self.below, self.above = np.copy(hist), np.copy(below), np.copy(above)
+        else:
+            if np.shape(mean) != np.shape(self.mean):
+                raise ValueError("Chunks must have {} channels, got {}".format(np.shape(self.mean), np.shape(mean)))
+            total = self.n + n
+            delta = mean - self.mean
+            self.mean = self.mean + delta * (n / total)
+            self.m2 = self.m2 + m2 + delta ** 2 * (self.n * n / total)
+            self.min = np.minimum(self.min, x_min)
+            self.max = np.maximum(self.max, x_max)
+            if hist is not None:
+                self.hist = self.hist + hist
+                self.below = self.below + below
+                self.above = self.above + above
+        self.n += n
+        self.var = self.m2 / (self.n - 1) if self.n > 1 else np.zeros_like(self.m2)
+        self.std = np.sqrt(self.var)
         return
+
+    def _histogram(self, x):
+        """
+        Function that calculates the histogram of every channel of a chunk with a single bincount.
+        :param x: (numpy array) chunk of shape (n, ...).
+        :return: hist (numpy array) counts of shape (bins, ...).
+                 below (numpy array) number of samples lower than the limits.
+                 above (numpy array) number of samples higher than the limits.
+        """
+        low, high = self.limits
+        channels = x.reshape(x.shape[0], -1)
+        below = np.sum(channels < low, axis=0)
+        above = np.sum(channels > high, axis=0)
+        inside = (channels >= low) & (channels <= high)
+
+        # Samples equal to the upper limit belong to the last bin, as in np.histogram
+        k = np.floor((channels - low) * (self.bins / (high - low)))
+        k = np.clip(np.nan_to_num(k), 0, self.bins - 1).astype(np.int64)
+        k += np.arange(channels.shape[1]) * self.bins
+        hist = np.bincount(k[inside], minlength=self.bins * channels.shape[1])
+        hist = hist.reshape(channels.shape[1], self.bins).T
+        return hist.reshape((self.bins,) + x.shape[1:]), below.reshape(x.shape[1:]), above.reshape(x.shape[1:])
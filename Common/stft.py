@@ -0,0 +1,195 @@
+import numpy as np
+from Common import fft
+from Common import windows
+
+
+class STFT():
+    def __init__(self, M, hop=None, window_type='hamming', nfft=None, pad=True, beta=None):
+        """
+        Class that calculates the short-time Fourier transform of a real signal and its inverse. The
+        signal is split in frames of M samples taken every hop samples, each frame is multiplied by a
+        window and transformed with the FFT. The inverse uses weighted overlap-add, which gives perfect
+        reconstruction for any window that does not vanish on the whole overlap.
+        :param M: (int) length of each frame.
+        :param hop: (int) number of samples between the start of two consecutive frames. By default M/2
+                is used.
+        :param window_type: (string) window to use from the window registry, 'hamming', 'blackman', 'hann',
+                'flattop', 'kaiser' or 'rectangular'. By default 'hamming' is used.
+        :param nfft: (int) size of the FFT of each frame, frames are zero padded to this size. By default M
+                is used.
+        :param pad: (boolean) if True the signal is padded with zeros at both ends so that every sample is
+                covered by the same number of frames, and the inverse returns the original samples. Frames
+                are processed in the precision of the signal, float32 signals give complex64 spectra.
+        :param beta: (float) shape parameter of the Kaiser window.
+        """
+        self.M = M
+        self.hop = M // 2 if hop is None else hop
+        self.nfft = M if nfft is None else nfft
+        self.pad = pad
+        if not 0 < self.hop <= M:
+            raise ValueError("hop must be between 1 and M")
+        if self.nfft < M:
+            raise ValueError("nfft must be at least M")
+        self.window = windows.get_window(window_type, M, beta=beta)
+        self.fft = fft.FFT()
+        return
+
+    def frames(self, x):
+        """
+        Function that splits a signal in frames without copying it.
+        :param x: (numpy array) input signal.
+        :return: (numpy array) read-only strided view of shape (number of frames, M).
+        """
+        x = np.ravel(x)
+        if x.shape[0] < self.M:
+            return np.zeros((0, self.M), dtype=x.dtype)
+        return np.lib.stride_tricks.sliding_window_view(x, self.M)[::self.hop]
+
+    def stft(self, x):
+        """
+        Function that calculates the STFT of a whole signal, transforming all frames in one call.
+        :param x: (numpy array) real input signal.
+        :return: (numpy array) one sided spectrum of each frame, of shape (number of frames, nfft/2+1).
+        """
+        x = np.ravel(x)
+        if self.pad:
+            start = np.zeros(self.M - self.hop, dtype=x.dtype)
+            end = np.zeros(self._end_padding(start.shape[0] + x.shape[0]), dtype=x.dtype)
+            x = np.concatenate((start, x, end))
+        return self._transform(self.frames(x))
+
+    def stream(self, chunks):
+        """
+        Generator that calculates the STFT of a signal that arrives in chunks. Frames are transformed as
+        soon as all their samples have arrived, and only the samples of an incomplete frame are kept, so
+        memory does not grow with the length of the signal. The spectra are the same as those of stft().
+        :param chunks: (iterable) chunks of the real input signal.
+        :return: (generator) one sided spectrum of each frame, of size nfft/2+1.
+        """
+        # float32 is the lowest precision, so the buffer takes the precision of the chunks
+        buffer = np.zeros(self.M - self.hop if self.pad else 0, dtype=np.float32)
+        for chunk in chunks:
+            buffer = np.concatenate((buffer, np.ravel(chunk)))
+            spectra = self._transform(self.frames(buffer))
+            buffer = buffer[spectra.shape[0] * self.hop:]
+            for spectrum in spectra:
+                yield spectrum
+
+        if self.pad:
+            buffer = np.concatenate((buffer, np.zeros(self._end_padding(buffer.shape[0]), dtype=buffer.dtype)))
+            for spectrum in self._transform(self.frames(buffer)):
+                yield spectrum
+
+    def istft(self, spectra, length=None):
+        """
+        Function that rebuilds a signal from the STFT of all its frames with weighted overlap-add.
+        :param spectra: (numpy array) one sided spectrum of each frame, of shape (number of frames, nfft/2+1).
+        :param length: (int) length of the original signal. If given, the output is cut to this length.
+        :return: (numpy array) rebuilt signal.
+        """
+        frames = self._inverse(spectra)
+        F = frames.shape[0]
+        J = -(-self.M // self.hop)
+
+        blocks = np.zeros((F, J * self.hop), dtype=frames.dtype)
+        blocks[:, :self.M] = frames
+        blocks = blocks.reshape(F, J, self.hop)
+        weights = np.zeros(J * self.hop)
+        weights[:self.M] = self.window ** 2
+        weights = weights.reshape(J, self.hop)
+
+        y = np.zeros((F + J) * self.hop, dtype=frames.dtype)
+        norm = np.zeros((F + J) * self.hop, dtype=frames.dtype)
+        for j in range(J):
+            y[j * self.hop:(j + F) * self.hop].reshape(F, self.hop)[:] += blocks[:, j, :]
+            norm[j * self.hop:(j + F) * self.hop].reshape(F, self.hop)[:] += weights[j]
+
+        y = self._normalize(y, norm)[:(F - 1) * self.hop + self.M]
+        if self.pad:
+            y = y[self.M - self.hop:]
+        if length is not None:
+            y = y[:length]
+        return y
+
+    def istream(self, spectra, length=None):
+        """
+        Generator that rebuilds a signal from a stream of frame spectra with weighted overlap-add. Each
+        frame releases the hop samples that no later frame overlaps, so memory stays constant. The overlap
+        is accumulated in double precision and released in the precision of the spectra.
+        :param spectra: (iterable) one sided spectrum of each frame, of size nfft/2+1.
+        :param length: (int) length of the original signal. If given, no samples past it are returned.
+        :return: (generator) chunks of the rebuilt signal.
+        """
+        y = np.zeros(self.M)
+        norm = np.zeros(self.M)
+        skip = self.M - self.hop if self.pad else 0
+        remaining = np.inf if length is None else length
+        dtype = np.float64
+
+        def release(samples):
+            nonlocal skip, remaining
+            drop = min(skip, samples.shape[0])
+            skip -= drop
+            samples = samples[drop:drop + int(min(remaining, samples.shape[0] - drop))]
+            remaining -= samples.shape[0]
+            return samples
+
+        for spectrum in spectra:
+            frame = self._inverse(np.asarray(spectrum).reshape(1, -1))[0]
+            dtype = frame.dtype
+            y += frame
+            norm += self.window ** 2
+            out = release(self._normalize(y[:self.hop], norm[:self.hop]).astype(dtype))
+            y = np.concatenate((y[self.hop:], np.zeros(self.hop)))
+            norm = np.concatenate((norm[self.hop:], np.zeros(self.hop)))
+            if out.shape[0] > 0:
+                yield out
+
+        out = release(self._normalize(y[:self.M - self.hop], norm[:self.M - self.hop]).astype(dtype))
+        if out.shape[0] > 0:
+            yield out
+
+    def _transform(self, frames):
+        """
+        Function that windows, zero pads and transforms a batch of frames.
+        :param frames: (numpy array) frames of shape (number of frames, M).
+        :return: (numpy array) one sided spectra of shape (number of frames, nfft/2+1).
+        """
+        real = fft.working_dtype(frames)
+        windowed = np.zeros((frames.shape[0], self.nfft), dtype=real)
+        windowed[:, :self.M] = frames * self.window.astype(real, copy=False)
+        return self.fft.fft(windowed, axis=-1)
+
+    def _inverse(self, spectra):
+        """
+        Function that inverts a batch of spectra and windows the resulting frames.
+        :param spectra: (numpy array) one sided spectra of shape (number of frames, nfft/2+1).
+        :return: (numpy array) windowed frames of shape (number of frames, M).
+        """
+        spectra = np.asarray(spectra)
+        if self.nfft % 2 == 0:
+            frames = self.fft.ifft(spectra, axis=-1)
+        else:
+            full = np.concatenate((spectra, np.conj(spectra[:, :0:-1])), axis=-1)
+            frames = self.fft.ifft(full, one_sided=False, axis=-1).real
+        return frames[:, :self.M] * self.window.astype(frames.dtype, copy=False)
+
+    def _end_padding(self, length):
+        """
+        Function that calculates the number of zeros appended at the end of a padded signal, so that its
+        last sample is covered by all overlapping frames and the last frame is complete.
+        :param length: (int) length of the signal, including the padding at the start.
+        :return: (int) number of zeros to append.
+        """
+        end = self.M - self.hop
+        return end + (-(length + end - self.M)) % self.hop
+
+    def _normalize(self, y, norm):
+        """
+        Function that divides the overlap-added frames by the overlap-added squared window.
+        :param y: (numpy array) overlap-added frames.
+        :param norm: (numpy array) overlap-added squared window.
+        :return: (numpy array) normalized samples, zero where the window sum vanishes.
+        """
+        tiny = np.finfo(float).tiny
+        return np.where(norm > tiny, y / np.where(norm > tiny, norm, 1), 0)
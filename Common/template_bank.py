@@ -0,0 +1,129 @@
+import numpy as np
+from Common import fft
+
+
+# Maximum number of correlation samples computed at once when scoring. Larger sets of signals are
+# scored in batches so memory stays bounded.
+SCORE_BATCH_SAMPLES = 2 ** 22
+
+
+class TemplateBank():
+    def __init__(self):
+        """
+        Class that classifies signals by their normalized correlation with a bank of templates, as done in
+        Project 2 with the average rock and mine signals. Each label has one template, the average of all
+        the signals seen for that label. The spectra of the templates are cached and only recalculated for
+        the labels that change, and all signals are correlated with all templates in one batched FFT.
+        """
+        self.labels = []
+        self.sums = []
+        self.counts = []
+        self.fft = fft.FFT()
+        self._spectra = {}
+        return
+
+    @property
+    def templates(self):
+        """
+        Templates of the bank, one row per label in the order of self.labels.
+        :return: (numpy array) matrix of size K by M.
+        """
+        return np.array([s / n for s, n in zip(self.sums, self.counts)])
+
+    def fit(self, signals, labels):
+        """
+        Function that builds the templates from a set of labelled signals, replacing the current bank.
+        :param signals: (numpy array) matrix of size N by M, one signal per row.
+        :param labels: (array) label of each signal.
+        :return: (TemplateBank) the bank itself.
+        """
+        self.labels, self.sums, self.counts = [], [], []
+        self._spectra = {}
+        return self.update(signals, labels)
+
+    def update(self, signals, labels):
+        """
+        Function that adds labelled signals to the bank. The template of each label becomes the average of
+        all its signals, and only the cached spectra of the changed labels are discarded.
+        :param signals: (numpy array) matrix of size N by M, one signal per row, or a single signal.
+        :param labels: (array) label of each signal, or a single label.
+        :return: (TemplateBank) the bank itself.
+        """
+        signals = np.atleast_2d(np.asarray(signals, dtype=float))
+        labels = np.atleast_1d(np.asarray(labels))
+        if signals.shape[0] != labels.shape[0]:
+            raise ValueError("There must be one label per signal")
+        if self.sums and signals.shape[1] != self.sums[0].shape[0]:
+            raise ValueError("All signals must have {} samples".format(self.sums[0].shape[0]))
+
+        for label in np.unique(labels):
+            selected = signals[labels == label]
+            if label in self.labels:
+                k = self.labels.index(label)
+                self.sums[k] = self.sums[k] + selected.sum(axis=0)
+                self.counts[k] += selected.shape[0]
+            else:
+                self.labels.append(label)
+                self.sums.append(selected.sum(axis=0))
+                self.counts.append(selected.shape[0])
+            for cache in self._spectra.values():
+                cache.pop(label, None)
+        return self
+
+    def scores(self, signals):
+        """
+        Function that calculates the maximum normalized correlation of every signal with every template,
+        the same value given by Correlation.norm_correlation(x, template).max().
+        :param signals: (numpy array) matrix of size N by L, one signal per row, or a single signal.
+        :return: (numpy array) matrix of size N by K of normalized correlation peaks.
+        """
+        signals = np.atleast_2d(np.asarray(signals, dtype=float))
+        templates = self.templates
+        N, L = signals.shape
+        M = templates.shape[1]
+        nfft = 1 << int(np.ceil(np.log2(L + M - 1)))
+
+        T = self._template_spectra(nfft)
+        template_energy = np.sum(templates ** 2, axis=1)
+        scores = np.empty((N, len(self.labels)))
+        batch = max(1, SCORE_BATCH_SAMPLES // (nfft * len(self.labels)))
+        for k in range(0, N, batch):
+            block = signals[k:k + batch]
+            S = self.fft.fft(_pad(block, nfft), axis=-1)
+            r = self.fft.ifft(S[:, np.newaxis, :] * np.conj(T), axis=-1)
+            energy = np.sum(block ** 2, axis=1)
+            scores[k:k + batch] = r.max(axis=-1) / np.sqrt(np.outer(energy, template_energy))
+        return scores
+
+    def classify(self, signals):
+        """
+        Function that assigns to each signal the label of the template with the highest score.
+        :param signals: (numpy array) matrix of size N by L, one signal per row, or a single signal.
+        :return: (numpy array) predicted label of each signal.
+        """
+        return np.asarray(self.labels)[np.argmax(self.scores(signals), axis=1)]
+
+    def _template_spectra(self, nfft):
+        """
+        Function that returns the one sided spectra of the templates zero padded to nfft samples, reusing the
+        cached spectra of the labels that did not change.
+        :param nfft: (int) size of the FFT.
+        :return: (numpy array) matrix of size K by nfft/2+1.
+        """
+        cache = self._spectra.setdefault(nfft, {})
+        for label, s, n in zip(self.labels, self.sums, self.counts):
+            if label not in cache:
+                cache[label] = self.fft.fft(_pad((s / n).reshape(1, -1), nfft), axis=-1)[0]
+        return np.array([cache[label] for label in self.labels])
+
+
+def _pad(x, nfft):
+    """
+    Function that zero pads the rows of a matrix to nfft samples.
+    :param x: (numpy array) matrix with one signal per row.
+    :param nfft: (int) new number of columns.
+    :return: (numpy array) padded matrix.
+    """
+    padded = np.zeros((x.shape[0], nfft))
+    padded[:, :x.shape[1]] = x
+    return padded
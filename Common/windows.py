@@ -0,0 +1,123 @@
+import numpy as np
+from collections import OrderedDict
+
+
+# Maximum number of windows kept in memory. The least recently used window is evicted first.
+WINDOW_CACHE_SIZE = 64
+
+# Cosine-sum coefficients a_k of w[n] = sum((-1)^k * a_k * cos(2*pi*k*n/D)), with D = M for periodic
+# windows and D = M-1 for symmetric windows.
+COSINE_WINDOWS = {
+    'rectangular': (1.0,),
+    'hann': (0.5, 0.5),
+    'hamming': (0.54, 0.46),
+    'blackman': (0.42, 0.5, 0.08),
+    'flattop': (0.21557895, 0.41663158, 0.277263158, 0.083578947, 0.006947368),
+}
+
+_window_cache = OrderedDict()
+_metrics_cache = OrderedDict()
+
+
+def get_window(window_type, M, dtype=np.float64, symmetric=False, beta=None):
+    """
+    Function that returns a precomputed window shared by all callers. Windows are kept in a least recently
+    used cache of WINDOW_CACHE_SIZE entries keyed by (window_type, M, dtype, symmetric, beta) and are
+    read-only, so they can be shared safely; use np.copy to get a writable window.
+    :param window_type: (string) 'rectangular', 'hann', 'hamming', 'blackman', 'flattop' or 'kaiser'.
+    :param M: (int) length of the window.
+    :param dtype: (numpy dtype) type of the window samples. By default float64 is used.
+    :param symmetric: (boolean) if False a periodic window is returned, as used for spectral analysis and
+            by the FIR designs of even size. If True a symmetric window is returned, as used by the FIR
+            designs of odd size.
+    :param beta: (float) shape parameter of the Kaiser window. Only used, and required, for 'kaiser'.
+    :return: (numpy array) read-only window of size M.
+    """
+    if window_type == 'kaiser':
+        if beta is None:
+            raise ValueError("The Kaiser window needs a beta parameter")
+        beta = float(beta)
+    else:
+        beta = None
+    key = (window_type, int(M), np.dtype(dtype), bool(symmetric), beta)
+
+    window = _window_cache.get(key)
+    if window is not None:
+        _window_cache.move_to_end(key)
+        return window
+
+    window = _calculate_window(window_type, int(M), symmetric, beta).astype(dtype)
+    window.setflags(write=False)
+    _window_cache[key] = window
+    while len(_window_cache) > WINDOW_CACHE_SIZE:
+        _window_cache.popitem(last=False)
+    return window
+
+
+def window_metrics(window_type, M, symmetric=False, beta=None):
+    """
+    Function that calculates the figures of merit of a window used for spectral analysis.
+    :param window_type: (string) type of window, see get_window.
+    :param M: (int) length of the window.
+    :param symmetric: (boolean) if True the symmetric window is used, otherwise the periodic one.
+    :param beta: (float) shape parameter of the Kaiser window.
+    :return: (dict) 'coherent_gain', the mean of the window, which scales the amplitude of a tone;
+             'enbw', the equivalent noise bandwidth in bins; and 'scalloping_loss', the loss in dB of a tone
+             half way between two bins.
+    """
+    key = (window_type, int(M), bool(symmetric), None if beta is None else float(beta))
+    metrics = _metrics_cache.get(key)
+    if metrics is not None:
+        _metrics_cache.move_to_end(key)
+        return dict(metrics)
+
+    w = get_window(window_type, M, np.float64, symmetric, beta)
+    n = np.arange(M)
+    total = np.sum(w)
+    metrics = {
+        'coherent_gain': total / M,
+        'enbw': M * np.sum(w ** 2) / total ** 2,
+        'scalloping_loss': -20 * np.log10(np.abs(np.sum(w * np.exp(-1j * np.pi * n / M))) / total),
+    }
+    _metrics_cache[key] = metrics
+    while len(_metrics_cache) > WINDOW_CACHE_SIZE:
+        _metrics_cache.popitem(last=False)
+    return dict(metrics)
+
+
+def clear_window_cache():
+    """
+    Function that removes all cached windows and window metrics.
+    :return: None
+    """
+    _window_cache.clear()
+    _metrics_cache.clear()
+    return
+
+
+def _calculate_window(window_type, M, symmetric, beta):
+    """
+    Function that calculates a window.
+    :param window_type: (string) type of window, see get_window.
+    :param M: (int) length of the window.
+    :param symmetric: (boolean) if True the symmetric window is calculated, otherwise the periodic one.
+    :param beta: (float) shape parameter of the Kaiser window.
+    :return: (numpy array) window of size M.
+    """
+    if M <= 1:
+        return np.ones(M)
+
+    if window_type == 'kaiser':
+        # The periodic window is the symmetric window of size M+1 without its last sample
+        L = M if symmetric else M + 1
+        n = np.arange(M)
+        return np.i0(beta * np.sqrt(1 - (2 * n / (L - 1) - 1) ** 2)) / np.i0(beta)
+
+    if window_type not in COSINE_WINDOWS:
+        raise ValueError("Unknown window_type '{}'".format(window_type))
+    D = M - 1 if symmetric else M
+    x = np.arange(0, M, 1)
+    w = np.zeros(M)
+    for k, a in enumerate(COSINE_WINDOWS[window_type]):
+        w += (-1) ** k * a * np.cos(2 * np.pi * k * x / D)
+    return w
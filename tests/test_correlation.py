@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from Common import correlation
+
+
+def full_correlation(x, h, max_lag):
+    r = np.correlate(x, h, 'full')
+    zero_lag = h.shape[0] - 1
+    return r[zero_lag - max_lag:zero_lag + max_lag + 1]
+
+
+@pytest.mark.parametrize('N, M', [(4000, 4000), (3000, 700), (700, 3000)])
+@pytest.mark.parametrize('complex_input', [False, True])
+def test_lag_limited_correlation(N, M, complex_input):
+    rng = np.random.default_rng(0)
+    x = rng.standard_normal(N)
+    h = rng.standard_normal(M)
+    if complex_input:
+        x = x + 1j * rng.standard_normal(N)
+        h = h + 1j * rng.standard_normal(M)
+    r = correlation.Correlation().correlation(x, h, 'fft', max_lag=129)
+    assert np.allclose(r, full_correlation(x, h, 129))
+
+
+def test_lag_limited_correlation_keeps_single_precision():
+    x = np.random.default_rng(1).standard_normal(5000).astype(np.float32)
+    r = correlation.Correlation().correlation(x, x, 'fft', max_lag=40)
+    assert r.dtype == np.float32
+    reference = full_correlation(x.astype(np.float64), x.astype(np.float64), 40)
+    assert np.max(np.abs(r - reference)) < 1e-5 * reference[40]
+
+
+def test_normalized_correlation_defaults():
+    x = np.random.default_rng(2).standard_normal(300)
+    C = correlation.Correlation()
+    assert np.max(C.norm_auto_corr(x)) == pytest.approx(1)
+    assert np.allclose(C.norm_correlation(x, 2 * x), C.norm_auto_corr(x))
+
+
+def test_normalized_correlation_unimplemented_algorithm():
+    with pytest.raises(ValueError, match="'output'"):
+        correlation.Correlation().norm_auto_corr(np.ones(8), 'output')
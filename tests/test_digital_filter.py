@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from Common import digital_filter
+
+
+def expected_response(a, b, w):
+    z = np.exp(1j * np.asarray(w))
+    return np.polyval(a[::-1], z) / np.polyval(b[::-1], z)
+
+
+@pytest.mark.parametrize('method', ['auto', 'horner'])
+def test_frequency_response_accepts_lists(method):
+    w = np.arange(0, np.pi, 0.1)
+    H = digital_filter.filter_frequency_response([1, 2], [1, 0.5], w, method)
+    assert np.allclose(H, expected_response([1, 2], [1, 0.5], w))
+
+
+def test_frequency_response_fft_accepts_lists():
+    w = 2 * np.pi * np.arange(64) / 64
+    H = digital_filter.filter_frequency_response([1, 2, 1], [1, -0.5], w, 'fft')
+    assert np.allclose(H, expected_response([1, 2, 1], [1, -0.5], w))
+
+
+def test_frequency_response_methods_agree():
+    a = np.array([0.2, 0.3, 0.2])
+    b = np.array([1.0, -0.4, 0.1])
+    w = 2 * np.pi * np.arange(1000) / 1000
+    horner = digital_filter.filter_frequency_response(a, b, w, 'horner', chunk_size=64)
+    assert np.allclose(horner, digital_filter.filter_frequency_response(a, b, w, 'fft'))
+    assert np.allclose(horner, expected_response(a, b, w))
@@ -0,0 +1,85 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from Common import fir
+
+
+def response(h, f):
+    """
+    Function that evaluates the magnitude of the frequency response of a kernel.
+    :param h: (numpy array) filter kernel.
+    :param f: (float) normalized frequency between 0 and 0.5.
+    :return: (float) magnitude of the response at f.
+    """
+    return np.abs(np.sum(h * np.exp(-2j * np.pi * f * np.arange(h.shape[0]))))
+
+
+@pytest.mark.parametrize('M', [100, 101])
+@pytest.mark.parametrize('window_type', ['hamming', 'blackman'])
+def test_low_pass_response(M, window_type):
+    h = fir.FIR().low_pass_filter(0.2, M, window_type)
+    assert response(h, 0.05) == pytest.approx(1, abs=0.01)
+    assert response(h, 0.3) < 0.01
+
+
+@pytest.mark.parametrize('M', [100, 101])
+@pytest.mark.parametrize('method', ['spectral_inversion', 'spectral_reversal'])
+def test_high_pass_response(M, method):
+    h = fir.FIR().high_pass_filter(0.2, M, method)
+    assert response(h, 0.1) < 0.01
+    assert response(h, 0.4) == pytest.approx(1, abs=0.01)
+
+
+@pytest.mark.parametrize('M', [100, 101])
+def test_band_filter_response(M):
+    F = fir.FIR()
+    reject = F.band_filter(0.1, 0.3, M, 'reject')
+    band = F.band_filter(0.1, 0.3, M, 'pass')
+    assert response(reject, 0.2) < 0.01
+    assert response(band, 0.2) == pytest.approx(1, abs=0.01)
+    for f in (0.02, 0.45):
+        assert response(reject, f) == pytest.approx(1, abs=0.01)
+        assert response(band, f) < 0.01
+
+
+@pytest.mark.parametrize('M', [100, 101])
+def test_kernel_is_centered(M):
+    h = fir.FIR().low_pass_filter(0.2, M)
+    assert np.argmax(h) == M // 2
+    # Odd kernels are exactly symmetric, even kernels have an extra first sample
+    assert np.allclose(h[M % 2 == 0:], h[M % 2 == 0:][::-1])
+
+
+def test_cached_designs_are_counted_once():
+    cached = fir.CachedFIR()
+    h = cached.low_pass_filter(0.2, 101)
+    assert np.array_equal(h, fir.FIR().low_pass_filter(0.2, 101))
+    assert cached.low_pass_filter(np.float64(0.2), np.int64(101)) is h
+    info = cached.cache_info()
+    assert (info['hits'], info['misses'], info['size']) == (1, 1, 1)
+    with pytest.raises(ValueError):
+        h[0] = 1
+
+
+def test_cached_designs_from_several_threads():
+    cached = fir.CachedFIR(maxsize=8)
+    requests = [(0.01 * (k % 20 + 1), 51 + 2 * (k % 3)) for k in range(2000)]
+    with ThreadPoolExecutor(8) as pool:
+        kernels = list(pool.map(lambda r: cached.low_pass_filter(*r), requests))
+    for (fc, M), h in zip(requests, kernels):
+        assert np.array_equal(h, fir.FIR().low_pass_filter(fc, M))
+    info = cached.cache_info()
+    assert info['hits'] + info['misses'] == len(requests)
+    assert info['size'] == len(cached.cache) <= 8
+
+
+def test_design_in_progress_does_not_disable_other_threads():
+    cached = fir.CachedFIR()
+    # The flag set while this thread calculates a design must not be seen by other threads
+    cached._local.designing = True
+    with ThreadPoolExecutor(1) as pool:
+        pool.submit(cached.low_pass_filter, 0.2, 101).result()
+    cached._local.designing = False
+    assert cached.cache_info()['misses'] == 1
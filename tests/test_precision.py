@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+from Common import adaptive
+from Common import convolution
+from Common import correlation
+from Common import fft
+from Common import fir
+from Common import fourier_transform
+from Common import multirate
+from Common import psd
+from Common import stft
+
+
+# Largest error of a single precision result relative to the peak of the double precision result
+SINGLE_PRECISION_ERROR = 1e-5
+
+KERNEL = fir.FIR().low_pass_filter(0.1, 101)
+
+
+def _istft(x):
+    transform = stft.STFT(256)
+    return transform.istft(transform.stft(x), x.shape[0])
+
+
+# Each routine maps a signal to a result that must keep the precision of the signal
+ROUTINES = {
+    'FFT.fft': lambda x: fft.FFT().fft(x),
+    'FFT.fft[two sided]': lambda x: fft.FFT().fft(x, one_sided=False),
+    'FFT.ifft': lambda x: fft.FFT().ifft(fft.FFT().fft(x)),
+    'FFT.rfft': lambda x: fft.FFT().rfft(x),
+    'FFT.irfft': lambda x: fft.FFT().irfft(fft.FFT().rfft(x)),
+    'Convolve.fft_convolve[overlap_add]': lambda x: convolution.Convolve().fft_convolve(x, KERNEL.astype(x.dtype)),
+    'Convolve.fft_convolve[overlap_save]':
+        lambda x: convolution.Convolve().fft_convolve(x, KERNEL.astype(x.dtype), 'overlap_save'),
+    'Correlation.correlation[max_lag]': lambda x: correlation.Correlation().correlation(x, x, 'fft', max_lag=64),
+    'StreamingFIR.process': lambda x: fir.StreamingFIR(KERNEL.astype(x.dtype)).process(x),
+    'FourierTransform.dft': lambda x: fourier_transform.FourierTransform(x[:256]).rex,
+    'STFT.stft': lambda x: stft.STFT(256).stft(x),
+    'STFT.istft': _istft,
+    'welch': lambda x: psd.welch(x, 256)[1],
+    'decimate': lambda x: multirate.decimate(x, 4),
+    'interpolate': lambda x: multirate.interpolate(x, 3),
+    'LMS.update': lambda x: adaptive.LMS(16, dtype=x.dtype).update(x, x)[0],
+}
+
+
+@pytest.mark.parametrize('name', list(ROUTINES))
+def test_single_precision_in_single_precision_out(name):
+    x = np.random.default_rng(0).standard_normal(4096)
+    single = ROUTINES[name](x.astype(np.float32))
+    double = ROUTINES[name](x)
+    assert np.finfo(single.dtype).dtype == np.float32
+    assert np.finfo(double.dtype).dtype == np.float64
+    # Same result in half the memory
+    assert single.nbytes * 2 == double.nbytes
+    assert np.max(np.abs(single - double)) < SINGLE_PRECISION_ERROR * np.max(np.abs(double))
+
+
+@pytest.mark.parametrize('name', ['FFT.fft[two sided]', 'Convolve.fft_convolve[overlap_add]',
+                                  'Correlation.correlation[max_lag]'])
+def test_complex64_in_complex64_out(name):
+    rng = np.random.default_rng(1)
+    x = rng.standard_normal(4096) + 1j * rng.standard_normal(4096)
+    single = ROUTINES[name](x.astype(np.complex64))
+    double = ROUTINES[name](x)
+    assert single.dtype == np.complex64
+    assert np.max(np.abs(single - double)) < SINGLE_PRECISION_ERROR * np.max(np.abs(double))
+
+
+@pytest.mark.parametrize('arrays, expected', [
+    ((np.zeros(2, np.float32),), np.float32),
+    ((np.zeros(2, np.complex64),), np.float32),
+    ((np.zeros(2, np.float32), np.zeros(2, np.int16)), np.float32),
+    ((np.zeros(2, np.int8),), np.float32),
+    ((np.zeros(2, np.float32), np.zeros(2)), np.float64),
+    ((np.zeros(2, np.int32),), np.float64),
+    (([1, 2],), np.float64),
+])
+def test_working_dtype(arrays, expected):
+    assert fft.working_dtype(*arrays) == expected
+
+
+def test_working_dtype_override():
+    assert fft.working_dtype(np.zeros(2), dtype=np.float32) == np.float32
+    assert fft.working_dtype(np.zeros(2, np.float32), dtype=np.complex128) == np.float64
+    x = np.random.default_rng(2).standard_normal(1024)
+    assert fft.FFT().fft(x, dtype=np.float32).dtype == np.complex64
+
+
+def test_to_precision():
+    assert fft.to_precision(np.zeros(2), np.float32).dtype == np.float32
+    assert fft.to_precision(np.zeros(2, np.complex128), np.float32).dtype == np.complex64
+    assert fft.to_precision(np.zeros(2, np.complex64), np.float64).dtype == np.complex128
+    x = np.zeros(2, np.float32)
+    assert fft.to_precision(x, np.float32) is x
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+def test_fir_design_dtype(dtype):
+    F = fir.FIR()
+    h = F.low_pass_filter(0.1, 101, dtype=dtype)
+    assert h.dtype == dtype
+    assert np.allclose(h, F.low_pass_filter(0.1, 101), rtol=0, atol=1e-7)